@@ -1,37 +1,206 @@
 #!/usr/bin/env python3
 
 import os
+import sys
+import hashlib
+import tempfile
+import sqlite3
 from sqlite_utils import *
-import math
-from collections import defaultdict
+from collections import defaultdict, namedtuple, OrderedDict
 import operator
-import warnings
-from itertools import groupby
+from itertools import groupby, islice
 from decimal import Decimal
-from datetime import datetime, timedelta
+from datetime import datetime
 import csv
 import numpy as np
-import matplotlib
-import matplotlib.pyplot as plt
-from matplotlib.patches import Rectangle
-from scipy.interpolate import interp1d
-from scipy.stats import gaussian_kde
+from flare_events import EventDetector, detect_events, segment_indices
+from lookup_table import LinearInterpolant, LookupTable
+from profiler import Profiler, profiled
+from output_writers import WRITERS
+import flux_cache
+from decimate import METHODS as DECIMATION
+from bootstrap import Bands, bootstrap_curves
+from resample import Resampler
+from fit_backends import BACKENDS
+
+# matplotlib is imported lazily, so the compute-only api stays cheap to
+# import in batch jobs
+
+def _pyplot(show=False):
+
+    """ imports pyplot on first use, with a non-interactive backend
+    unless the figure is going to be shown or pyplot was already imported
+    (and its backend chosen) by the caller """
+
+    import matplotlib
+    if not show and 'matplotlib.pyplot' not in sys.modules:
+        matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    return plt
+
+def _float_or_nan(cell):
+
+    """ float of a flux cell, nan if it isn't a number """
+
+    try:
+        return float(cell)
+    except ValueError:
+        return float('nan')
+
+def parse_times(stamps, last=None):
+
+    """ parses timestamps to datetime64, either ISO (YYYY-MM-DD HH:MM[:SS[.f]],
+    with T or a space) or times of day (H:MM[:SS]). Times of day are put on
+    1900-01-01 and roll over to the next day whenever they go back in time,
+    also against last, the time before the first stamp """
+
+    stamps = np.char.strip(np.asarray(stamps, dtype=str))
+    if stamps.size == 0:
+        return np.empty(0, dtype='datetime64[us]')
+    if '-' in stamps[0]:
+        return np.char.rstrip(stamps, 'Z').astype('datetime64[us]')
+
+    # times of day from zero padded hours
+    stamps = np.where(np.char.find(stamps, ':') == 1, np.char.add('0', stamps), stamps)
+    day = np.datetime64('1900-01-01', 'us')
+    time_of_day = np.char.add('1900-01-01T', stamps).astype('datetime64[us]') - day
+
+    # days passed since the first day (or the day of last)
+    if last is not None:
+        day = last.astype('datetime64[D]').astype('datetime64[us]')
+        previous = np.concatenate(([last - day], time_of_day[:-1]))
+    else:
+        previous = np.concatenate((time_of_day[:1], time_of_day[:-1]))
+    days = np.cumsum(time_of_day < previous)
+
+    return day + time_of_day + days.astype('timedelta64[D]')
+
+def delta_t(ix_max):
+
+    """ time delay [min] of ED behind the flux, for the peak ix, no
+    delay without a positive peak (a series of nan's only) """
+
+    ix_max = np.asarray(ix_max, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        delays = 0.45385 + (-0.44863*np.log10(ix_max))
+
+    return np.where(ix_max > 0, delays, 0.0)
+
+def delay_times(times, delays):
+
+    """ times shifted by delays [min], rounded to microseconds """
+
+    return times + np.round(delays*6.0e7).astype('timedelta64[us]')
+
+def format_times(chunk, dated, text=True):
+
+    """ converts timestamps of a calculated chunk to datetime64, formatted
+    for text formats as H:M:S strings, or as Y-M-D H:M:S strings when
+    dated """
+
+    formatted = {}
+    for key, values in chunk.items():
+        if key in ('Time', 'Time(Ix)', 'Time(ED)'):
+            times = np.asarray(values, dtype='datetime64[us]')
+            if text:
+                # YYYY-MM-DDTHH:MM:SS, cut to its time part or with
+                # a space between date and time
+                stamps = np.datetime_as_string(times, unit='s').astype('U19')
+                chars = stamps.view('U1').reshape(-1, 19)
+                if dated:
+                    chars[:, 10] = ' '
+                    formatted['%s (Y-M-D H:M:S)' % key] = stamps
+                else:
+                    formatted['%s (H:M:S)' % key] = np.ascontiguousarray(
+                            chars[:, 11:]).view('U8').ravel()
+            else:
+                formatted[key] = times
+        else:
+            formatted[key] = values
+
+    return formatted
+
+# handling of ix's outside of the fitted range: clamped to its ends,
+# extrapolated linearly in log10(ix) from the end knots, or nan
+OUT_OF_RANGE = ('clamp', 'extrapolate', 'nan')
+
+# subset of the flares table a model is fitted on, transmitter and
+# flare_class take a name or a list of names (class letters like 'C', 'M'),
+# dates are inclusive YYYY-MM-DD strings or dates, class_from and class_to
+# inclusive bounds of the class with its magnitude ('C5', 'M2.5', a letter
+# alone is magnitude 1), None means no restriction
+Subset = namedtuple('Subset',
+        'transmitter date_from date_to flare_class class_from class_to',
+        defaults=(None, None, None, None, None, None))
 
 class Flared:
 
     """ parent class for Flare Electron Density calculations """
 
-    def __init__(self):
+    database = r"data/flare_vlf.db"
+    model_cache = r"data/flare_vlf_model.npz"
+    easyfit_table = r"data/easyfit.csv"
+
+    # easyfit heights and coefficients per table file, loaded once per process
+    _easyfit_cache = {}
+
+    # policy for ix's outside of the fitted range, one of OUT_OF_RANGE
+    out_of_range = 'clamp'
+
+    # bounds [km] of the electron content added to the outputs, as a
+    # (low, high) pair, None for no content column
+    content_heights = None
+
+    # false position steps of the inverse solver after bracketing
+    inverse_iterations = 8
+
+    # confidence level of the bootstrap bands and the seed of the resampling
+    confidence = 0.95
+    bootstrap_seed = 0
+
+    # format of the data table, one of output_writers.WRITERS
+    output_format = 'csv'
+
+    # whether time columns of text data tables are written with their
+    # dates (Y-M-D H:M:S) or as times of day (H:M:S)
+    dated = False
+
+    # models already loaded in this process by model key and subset, shared
+    # by all instances (and by forked worker processes), least recently used
+    # models are dropped above model_memory_size
+    _models = OrderedDict()
+    model_memory_size = 16
+
+    # backend fitting the beta and hprim curves, one of fit_backends.BACKENDS,
+    # and the settings of the fits, both part of the model cache key
+    fit_backend = 'polyfit'
+    fit_settings = {'poly_deg': 15, 'tail_deg': 1, 'num': 100,
+            'poly_end': -40, 'tail_start': -10, 'cheb_deg': 8, 'knots': 400}
 
-        """ gets beta and fprim interpolated functions from polyfit,
-        sets folder and font """
+    def __init__(self, lookup=None, folder=None, subset=None, bootstrap=None,
+            workers=None, name=None):
 
+        """ gets beta and fprim interpolated functions from polyfit
+        (or from the model cache), sets folder and font. With lookup
+        (a table size) scalars are evaluated from log-spaced lookup tables.
+        Results go to folder, by default a new timestamped one under results
+        named after name (the class name if None).
+        With subset (a Subset) the model is fitted on the matching flares only.
+        With bootstrap (a number of replicates) confidence bands are estimated
+        by refits of resampled flares, spread across workers processes """
 
-        self.query, self.ix_vlf, self.beta_vlf, self.hprim_vlf = self._query_db()
+        self.profile = Profiler()
+        self._vlf = None
+        self.subset = self._normalize_subset(subset)
 
         self.f_beta, self.f_hprim, self.ix_vlf_reduced, self.beta_vlf_reduced, \
-                self.hprim_vlf_reduced = self._polyfit(self.query)
+                self.hprim_vlf_reduced = self._load_model()
 
+        if lookup:
+            self.f_beta = LookupTable(self.f_beta, self.f_beta.x, lookup)
+            self.f_hprim = LookupTable(self.f_hprim, self.f_hprim.x, lookup)
+
+        self.bands = self._bootstrap(bootstrap, workers) if bootstrap else None
 
         self.font = {'family': 'serif',
             'color':  'darkred',
@@ -39,98 +208,312 @@ class Flared:
             'size': 12,
             }
 
-        self.folder = "%s/%s-%s" % ("results", self.__class__.__name__,
-                int(datetime.now().timestamp()))
+        # results folder is created only when something is written to it,
+        # the default one is claimed then (see _make_folder)
+        if folder is None:
+            folder = "%s/%s-%s" % ("results", name or self.__class__.__name__,
+                    int(datetime.now().timestamp()))
+            self._default_folder = folder
+        else:
+            self._default_folder = None
+        self.folder = folder
+
+    @property
+    def query(self):
+        return self._get_vlf()[0]
+
+    @property
+    def ix_vlf(self):
+        return self._get_vlf()[1]
+
+    @property
+    def beta_vlf(self):
+        return self._get_vlf()[2]
+
+    @property
+    def hprim_vlf(self):
+        return self._get_vlf()[3]
+
+    def _get_vlf(self):
 
-        if not os.path.exists(self.folder):
-            os.mkdir(self.folder)
+        """ experimental values are queried only when needed,
+        a model cache hit doesn't touch the db """
 
+        if self._vlf is None:
+            self._vlf = self._query_db()
+        return self._vlf
+
+    @staticmethod
+    def _normalize_subset(subset):
+
+        """ subset as a hashable Subset with names as tuples, None
+        when nothing is restricted """
+
+        if subset is None:
+            return None
+        if isinstance(subset, dict):
+            subset = Subset(**subset)
+        subset = subset._replace(**{field: tuple([value] if isinstance(value, str)
+            else value) for field, value in (('transmitter', subset.transmitter),
+                ('flare_class', subset.flare_class)) if value is not None})
+        # dates (or date objects) compare as YYYY-MM-DD strings in sql
+        subset = subset._replace(**{field: str(value) for field, value in
+            (('date_from', subset.date_from), ('date_to', subset.date_to))
+            if value is not None})
+        for bound in (subset.class_from, subset.class_to):
+            if bound is not None and class_flux(bound) is None:
+                raise ValueError("flare class %r not recognized, expected a "
+                        "letter A, B, C, M or X with an optional magnitude" % (bound,))
+
+        return None if subset == Subset() else subset
+
+    def _subset_filter(self):
+
+        """ sql WHERE clause and its parameters selecting the subset """
+
+        if self.subset is None:
+            return "", ()
+
+        clauses = []
+        params = []
+        if self.subset.transmitter:
+            clauses.append("TRIM(transmiter) IN (%s)"
+                    % ",".join("?"*len(self.subset.transmitter)))
+            params += self.subset.transmitter
+        if self.subset.date_from:
+            clauses.append("iso_date(date) >= ?")
+            params.append(self.subset.date_from)
+        if self.subset.date_to:
+            clauses.append("iso_date(date) <= ?")
+            params.append(self.subset.date_to)
+        if self.subset.flare_class:
+            clauses.append("UPPER(SUBSTR(TRIM(class), 1, 1)) IN (%s)"
+                    % ",".join("?"*len(self.subset.flare_class)))
+            params += [c.upper() for c in self.subset.flare_class]
+        if self.subset.class_from:
+            clauses.append("class_flux(class) >= ?")
+            params.append(class_flux(self.subset.class_from))
+        if self.subset.class_to:
+            clauses.append("class_flux(class) <= ?")
+            params.append(class_flux(self.subset.class_to))
+
+        return "WHERE %s" % " AND ".join(clauses), tuple(params)
+
+    @profiled('query_db')
     def _query_db(self):
 
         """ queries db for experimental ix, beta and h values """
 
-        database = r"data/flare_vlf.db"
         table_name = 'flares'
-        conn = create_connection(database)
+        conn = create_connection(self.database)
+        create_date_function(conn)
+        create_class_function(conn)
+        where, params = self._subset_filter()
 
         # query for ix,beta,height tuples
         with conn:
             sql = """SELECT ix, beta, reflection_height \
-                    FROM %s \
-                    ORDER BY ix;""" %(table_name)
-            query = custom_query(conn, sql)
+                    FROM %s %s \
+                    ORDER BY ix;""" %(table_name, where)
+            query = custom_query(conn, sql, params)
+        self.profile.count('rows_queried', len(query))
         ix_vlf= self._extract_column(query, 0)
         beta_vlf= self._extract_column(query, 1)
         hprim_vlf= self._extract_column(query, 2)
 
         return query, ix_vlf, beta_vlf, hprim_vlf
 
-    def _polyfit(self, query):
+    def _model_key(self):
 
-        """ takes experimental values of ix, beta, height from a db,
-        make polynomial fit and interpolation of betas and hprim as
-        a function of ix """
+        """ hash of the db content and fit settings, any rewrite of the
+        flares table or change of settings invalidates the model cache """
 
-        ix_values, beta_values, hprim_values = map(list, zip(*self._get_list_of_averages(query)))
+        sha = hashlib.sha1()
+        with open(self.database, 'rb') as f:
+            sha.update(f.read())
 
-        x = ix_values
-        y = beta_values
-        y2 = hprim_values
+        # changes not yet checkpointed from a write-ahead log
+        if os.path.exists(self.database + "-wal"):
+            with open(self.database + "-wal", 'rb') as f:
+                sha.update(f.read())
+        sha.update(repr(sorted(self.fit_settings.items())).encode())
+        sha.update(self.fit_backend.encode())
 
-        # we fit first most of the curve as 15th degree polynomial,
-        # then skip jumpy parts then fit as 1st degree polynomial
-        warnings.filterwarnings('ignore')
+        return sha.hexdigest()
 
-        xpoly1 = np.linspace(x[0], x[-40], num=100, endpoint=True)
-        xpoly2 = np.linspace(x[-10], x[-1], num=100, endpoint=True)
+    @profiled('load_model')
+    def _load_model(self):
 
-        poly_deg = 15
-        ypoly1 = np.polyval(np.polyfit(x, y, poly_deg), xpoly1)
-        y2poly1 = np.polyval(np.polyfit(x, y2, poly_deg), xpoly1)
+        """ loads fitted curves from memory or from the model cache if its
+        key matches, otherwise refits the curves and rewrites the cache """
 
-        poly_deg = 1
-        ypoly2 = np.polyval(np.polyfit(x, y, poly_deg), xpoly2)
-        y2poly2 = np.polyval(np.polyfit(x, y2, poly_deg), xpoly2)
+        key = self._model_key()
+        memory_key = (key, self.subset)
+        if memory_key in Flared._models:
+            self.profile.count('model_memory_hits')
+            Flared._models.move_to_end(memory_key)
+            return Flared._models[memory_key]
 
-        # glue the dots again
-        xpoly = np.concatenate((xpoly1, xpoly2))
-        ypoly = np.concatenate((ypoly1, ypoly2))
-        y2poly = np.concatenate((y2poly1, y2poly2))
+        # only the model of the whole table is cached on disk, subsets
+        # are fitted from sql averages and kept in memory
+        use_disk = self.model_cache is not None and self.subset is None
+        model = None
+
+        if use_disk and os.path.exists(self._model_cache_path()):
+            try:
+                with np.load(self._model_cache_path()) as cache:
+                    if str(cache['key']) == key:
+                        model = {k: cache[k] for k in cache.files if k != 'key'}
+                        self.profile.count('model_cache_hits')
+            except (OSError, ValueError, KeyError):
+                model = None
+
+        if model is None:
+            model = self._fit_model()
+            if use_disk:
+                self._write_model_cache(key, model)
 
         # interpolate and calculate x and y's for the whole range
-        f_beta = interp1d(xpoly, ypoly)
-        f_hprim = interp1d(xpoly, y2poly)
+        f_beta = LinearInterpolant(model['xpoly'], model['ypoly'])
+        f_hprim = LinearInterpolant(model['xpoly'], model['y2poly'])
+
+        Flared._models[memory_key] = f_beta, f_hprim, model['x'].tolist(), \
+                model['y'].tolist(), model['y2'].tolist()
+        while len(Flared._models) > self.model_memory_size:
+            Flared._models.popitem(last=False)
+
+        return Flared._models[memory_key]
+
+    @profiled('bootstrap')
+    def _bootstrap(self, replicates, workers=None):
+
+        """ confidence bands of beta, h' and ED from refits of replicates
+        resamplings of the flares rows, evaluated at the model grid points """
+
+        if self.fit_backend != 'polyfit':
+            raise ValueError("bootstrap bands are refitted with the polyfit "
+                    "backend only, not %s" % self.fit_backend)
+
+        settings = self.fit_settings
+        x = self.ix_vlf_reduced
+        grids = (np.linspace(x[0], x[settings['poly_end']], num=settings['num'],
+                    endpoint=True),
+                np.linspace(x[settings['tail_start']], x[-1], num=settings['num'],
+                    endpoint=True))
 
-        return f_beta, f_hprim, x, y, y2
+        beta, hprim = bootstrap_curves(self.query, settings, grids, replicates,
+                self.bootstrap_seed, workers)
+        self.profile.count('bootstrap_replicates', replicates)
 
-    def _polyfit_linear(self, query):
+        return Bands(np.concatenate(grids), beta, hprim, self._wait_ed, self.confidence,
+                self.out_of_range)
+
+    def _model_cache_path(self):
+
+        """ model cache file of the fit backend, the polyfit one is
+        model_cache itself, others get the backend name appended """
+
+        if self.fit_backend == 'polyfit':
+            return self.model_cache
+        root, extension = os.path.splitext(self.model_cache)
+
+        return "%s-%s%s" % (root, self.fit_backend, extension)
+
+    def _write_model_cache(self, key, model):
+
+        """ writes the model to a temporary file and moves it in place,
+        so concurrent jobs never read a partially written cache """
+
+        path = self._model_cache_path()
+        folder = os.path.dirname(path) or '.'
+        try:
+            fd, tmp = tempfile.mkstemp(dir=folder, suffix='.npz')
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, key=key, **model)
+            os.replace(tmp, path)
+        except OSError as e:
+            print(e)
+
+    def _polyfit(self, query):
 
         """ takes experimental values of ix, beta, height from a db,
         make polynomial fit and interpolation of betas and hprim as
         a function of ix """
 
-        ix_values, beta_values, hprim_values = map(list, zip(*self._get_list_of_averages(query)))
+        model = self._fit_model(query)
 
-        x = ix_values
-        y = beta_values
-        y2 = hprim_values
+        # interpolate and calculate x and y's for the whole range
+        f_beta = LinearInterpolant(model['xpoly'], model['ypoly'])
+        f_hprim = LinearInterpolant(model['xpoly'], model['y2poly'])
 
-        # we fit first most of the curve as 15th degree polynomial,
-        # then skip jumpy parts then fit as 1st degree polynomial
-        warnings.filterwarnings('ignore')
+        return f_beta, f_hprim, model['x'].tolist(), model['y'].tolist(), \
+                model['y2'].tolist()
 
-        xpoly = np.linspace(x[0], x[-1], num=100, endpoint=True)
+    @profiled('fit_model')
+    def _fit_model(self, query=None):
 
-        poly_deg = 1
-        ypoly = np.polyval(np.polyfit(x, y, poly_deg), xpoly)
-        y2poly = np.polyval(np.polyfit(x, y2, poly_deg), xpoly)
+        """ fits beta and hprim curves to the averaged experimental values,
+        returns fitted points along with the averaged values. Without a query
+        the averages maintained in the db are used when available """
 
-        # interpolate and calculate x and y's for the whole range
-        f_beta = interp1d(xpoly, ypoly)
-        f_hprim = interp1d(xpoly, y2poly)
+        if query is None:
+            list_of_averages = self._query_averages()
+            if list_of_averages is None:
+                list_of_averages = self._get_list_of_averages(self.query)
+        else:
+            list_of_averages = self._get_list_of_averages(query)
+
+        # the backend checks there are enough points for its fit
+        ix_values, beta_values, hprim_values = map(list, zip(*list_of_averages)) \
+                if list_of_averages else ([], [], [])
 
-        return f_beta, f_hprim, x, y, y2
+        x = ix_values
+        y = beta_values
+        y2 = hprim_values
 
+        # knots of the curves, interpolated linearly on evaluation
+        xpoly, ypoly, y2poly = BACKENDS[self.fit_backend](x, y, y2, self.fit_settings)
+
+        return {'xpoly': xpoly, 'ypoly': ypoly, 'y2poly': y2poly,
+                'x': np.array(x), 'y': np.array(y), 'y2': np.array(y2)}
+
+    @profiled('query_averages')
+    def _query_averages(self):
+
+        """ queries per ix averages (of the subset) computed by sqlite, rounded
+        the same way as _get_list_of_averages, None for a db without the
+        averages maintained by csv_to_sqlite.py """
+
+        conn = create_connection(self.database)
+        create_date_function(conn)
+        create_class_function(conn)
+        where, params = self._subset_filter()
+
+        # a subset is averaged by sql from the flares table, the whole
+        # table has its averages maintained in flares_averages
+        if where:
+            sql = """SELECT ix, AVG(beta), AVG(reflection_height), COUNT(*) \
+                    FROM flares %s \
+                    GROUP BY ix \
+                    ORDER BY ix;""" %(where)
+        else:
+            sql = """SELECT ix, beta, reflection_height, n \
+                    FROM flares_averages \
+                    ORDER BY ix;"""
+        try:
+            with conn:
+                query = custom_query(conn, sql, params)
+        except sqlite3.Error:
+            return None
+        finally:
+            conn.close()
+
+        self.profile.count('rows_queried', len(query))
+
+        return [(ix, round(beta, 3), round(hprim, 3)) if n > 1 else (ix, beta, hprim)
+                for ix, beta, hprim, n in query]
+
+    @profiled('averages')
     def _get_list_of_averages(self, query):
 
         """there might be duplicated values for ix
@@ -165,6 +548,8 @@ class Flared:
         """ plot reduced vlf beta and hprim dots (see explanation in _polyfit along with
         interpolated beta and hprim functions of ix """
 
+        plt = _pyplot(show=True)
+
         x = self.ix_vlf_reduced
         y_l1 = self.beta_vlf_reduced
         y_l2 = self.f_beta(x)
@@ -178,7 +563,7 @@ class Flared:
         lns2 = ax.plot(x, y_l2, '-', color="thistle", markersize=4,
                 mec='red', mfc='white', label="beta interpolation")
 
-        plt.title("Polyfit of beta and hprim")
+        plt.title("%s fit of beta and hprim" % self.fit_backend.capitalize())
 
         ax.set_xlabel(r"Flux Intensity $[\mathrm{W*m^{-2}}]$", fontdict=self.font)
         ax.set_ylabel(r"Beta $[\mathrm{km^{-1}}]$", fontdict=self.font)
@@ -198,6 +583,9 @@ class Flared:
 
         """ Density and rug plot of a certain parameter (input data list) """
 
+        from scipy.stats import gaussian_kde
+        plt = _pyplot(show=True)
+
         density = gaussian_kde(data_list)
         xs = np.linspace(min(data_list),max(data_list),200)
         density.covariance_factor = lambda : .25
@@ -211,21 +599,309 @@ class Flared:
 
         plt.show()
 
-    def _write_to_csv(self, dict_of_lists):
+    @profiled('calculate_ed')
+    def calculate_ed(self, ix, h):
+
+        """ vectorized flarED engine, takes an array of ix's and an array of
+        heights and returns ED matrix (ix x h) along with beta and hprim arrays.
+        The broadcast is memory-bound (one exp per value written), so it runs
+        in process: shipping blocks of the matrix back from a process pool
+        costs more than it saves """
+
+        ix = np.atleast_1d(np.asarray(ix, dtype=float))
+        h = np.atleast_1d(np.asarray(h, dtype=float))
+
+        beta, hprim = self._evaluate_parameters(ix)
+        self.profile.count('samples_processed', ix.size)
+        self.profile.count('ed_values', ix.size*h.size)
+
+        ed = self._wait_ed(beta[:, np.newaxis], hprim[:, np.newaxis],
+                h[np.newaxis, :])
+
+        return ed, beta, hprim
+
+    @profiled('calculate_easyfit')
+    def calculate_easyfit(self, ix, h):
+
+        """ vectorized easyfit method, takes an array of ix's and an array
+        of heights and returns ED matrix (ix x h) """
+
+        ix = np.atleast_1d(np.asarray(ix, dtype=float))
+        a1, a2, a3 = self._easyfit_coefficients(h).T
+
+        log_ix = self._log10_ix(ix)[:, np.newaxis]
+        self.profile.count('easyfit_values', ix.size*a1.size)
+
+        return 10**(a1 + a2*log_ix + a3*log_ix**2)
+
+    @staticmethod
+    def _log10_ix(ix):
+
+        """ log10 of an array of ix's, nan for gaps and non-positive ix's """
+
+        return np.log10(ix, out=np.full(ix.shape, np.nan), where=ix > 0)
+
+    @profiled('calculate_points')
+    def calculate_points(self, ix, h):
+
+        """ ED's for pairs of ix and h (broadcast against each other) instead
+        of a full matrix, returns flared and easyfit ED's, beta and hprim """
+
+        ix, h = np.broadcast_arrays(np.asarray(ix, dtype=float),
+                np.asarray(h, dtype=float))
+        ix = ix.ravel()
+        h = h.ravel()
+
+        beta, hprim = self._evaluate_parameters(ix)
+        a1, a2, a3 = self._easyfit_coefficients(h).T
+        log_ix = self._log10_ix(ix)
+        self.profile.count('samples_processed', ix.size)
+
+        return self._wait_ed(beta, hprim, h), 10**(a1 + a2*log_ix + a3*log_ix**2), \
+                beta, hprim
+
+    @profiled('invert_ed')
+    def invert_ed(self, ed, h, iterations=None):
+
+        """ inverse of the flarED engine, takes ED's and heights (broadcast
+        against each other) and returns the ix's explaining them along with
+        beta and hprim. Every ED is bracketed between two knots of the model
+        and refined by a fixed number of Illinois false position steps on
+        log(ED). Where ED isn't monotonic in ix the lowest ix is returned,
+        ED's outside of the model's range give nan """
+
+        ed, h = np.broadcast_arrays(np.asarray(ed, dtype=float),
+                np.asarray(h, dtype=float))
+        shape = ed.shape
+        with np.errstate(divide='ignore', invalid='ignore'):
+            target = np.log(ed.ravel())
+        h = h.ravel()
+
+        knots = self.f_beta.x
+        beta_knots, hprim_knots = self._evaluate_parameters(knots)
+        a = np.full(target.shape, np.nan)
+        b, fa, fb = a.copy(), a.copy(), a.copy()
+
+        heights, index = np.unique(h, return_inverse=True)
+        for i, height in enumerate(heights):
+            log_ed = np.log(self._wait_ed(beta_knots, hprim_knots, height))
+            # the first knot where the running maximum (or minimum, for ED's
+            # under the lowest ix's one) reaches the target closes the
+            # bracket of the lowest root
+            for sign in (1, -1):
+                bound = np.maximum.accumulate(sign*log_ed)
+                rows = np.flatnonzero((index == i) & (sign*target >= sign*log_ed[0])
+                        & (sign*target <= bound[-1]))
+                j = np.clip(np.searchsorted(bound, sign*target[rows]), 1,
+                        len(knots) - 1)
+                a[rows], b[rows] = knots[j - 1], knots[j]
+                fa[rows] = log_ed[j - 1] - target[rows]
+                fb[rows] = log_ed[j] - target[rows]
+
+        solved = np.flatnonzero(~np.isnan(a))
+        a, b, fa, fb = a[solved], b[solved], fa[solved], fb[solved]
+        t, h_solved = target[solved], h[solved]
+
+        for _ in range(self.inverse_iterations if iterations is None else iterations):
+            step = fb - fa
+            x = np.where(step != 0, b - fb*(b - a)/np.where(step != 0, step, 1), b)
+            beta, hprim = self._evaluate_parameters(x)
+            fx = np.log(self._wait_ed(beta, hprim, h_solved)) - t
+            # keeps the root bracketed between a and b, halving the residual
+            # of an end point kept twice in a row
+            crossed = fx*fb < 0
+            a, fa = np.where(crossed, b, a), np.where(crossed, fb, fa/2)
+            b, fb = x, fx
+
+        ix = np.full(target.shape, np.nan)
+        ix[solved] = b
+        beta, hprim = np.full(target.shape, np.nan), np.full(target.shape, np.nan)
+        beta[solved], hprim[solved] = self._evaluate_parameters(b)
+
+        self.profile.count('inverse_values', target.size)
+        self.profile.count('inverse_unsolved', target.size - solved.size)
+
+        return ix.reshape(shape), beta.reshape(shape), hprim.reshape(shape)
+
+    @profiled('calculate_content')
+    def calculate_content(self, ix, h_low, h_high):
+
+        """ electron content [m^-2] of columns between heights h_low and
+        h_high [km] for an array of ix's, the integral of the Wait profile
+        in closed form, returned along with beta and hprim """
+
+        ix = np.atleast_1d(np.asarray(ix, dtype=float))
+        beta, hprim = self._evaluate_parameters(ix)
+        self.profile.count('samples_processed', ix.size)
+
+        return self._wait_content(beta, hprim, h_low, h_high), beta, hprim
+
+    def _load_easyfit(self):
+
+        """ reads easyfit table on first use, returns array of heights
+        and (h x 3) array of a1, a2, a3 coefficients """
+
+        if self.easyfit_table not in Flared._easyfit_cache:
+            table = np.loadtxt(self.easyfit_table, delimiter=',', skiprows=1,
+                    ndmin=2)
+            Flared._easyfit_cache[self.easyfit_table] = (table[:, 0], table[:, 1:])
+
+        return Flared._easyfit_cache[self.easyfit_table]
+
+    def _easyfit_coefficients(self, h):
+
+        """ easyfit coefficients (h x 3) for an array of heights, heights
+        between table rows get linearly interpolated coefficients """
+
+        heights, coefficients = self._load_easyfit()
+        h = np.atleast_1d(np.asarray(h, dtype=float))
+
+        if np.any(h < heights[0]) or np.any(h > heights[-1]):
+            raise ValueError("easyfit heights must be in range %g, %g"
+                    % (heights[0], heights[-1]))
+
+        return np.column_stack([np.interp(h, heights, coefficients[:, i])
+            for i in range(coefficients.shape[1])])
+
+    def _evaluate_parameters(self, ix):
+
+        """ evaluates beta and hprim for an array of ix's in a single call,
+        ix's outside of the fitted range are handled by the out_of_range
+        policy with array masks and counted, nan ix's give nan """
+
+        x = self.f_beta.x
+        ix = np.asarray(ix, dtype=float)
+        below, above = ix < x[0], ix > x[-1]
+        n_below, n_above = np.count_nonzero(below), np.count_nonzero(above)
+        if not (n_below or n_above):
+            return self.f_beta(ix), self.f_hprim(ix)
+
+        self.profile.count('ix_below_range', int(n_below))
+        self.profile.count('ix_above_range', int(n_above))
+        beta = self.f_beta(np.clip(ix, x[0], x[-1]))
+        hprim = self.f_hprim(np.clip(ix, x[0], x[-1]))
+
+        if self.out_of_range == 'nan':
+            beta[below | above] = np.nan
+            hprim[below | above] = np.nan
+        elif self.out_of_range == 'extrapolate':
+            with np.errstate(divide='ignore', invalid='ignore'):
+                for outside, end, inner in ((below, 0, 1), (above, -1, -2)):
+                    du = np.log10(ix[outside]) - np.log10(x[end])
+                    du[ix[outside] <= 0] = np.nan
+                    step = np.log10(x[end]) - np.log10(x[inner])
+                    for values, f in ((beta, self.f_beta), (hprim, self.f_hprim)):
+                        ends = f(x[[end, inner]])
+                        values[outside] += du*(ends[0] - ends[1])/step
+
+        return beta, hprim
+
+    def out_of_range_note(self):
+
+        """ summary of the ix's found outside of the fitted range so far,
+        None if there were none """
 
-        """writes data from dict to csv"""
+        below = self.profile.counters.get('ix_below_range', 0)
+        above = self.profile.counters.get('ix_above_range', 0)
+        if not (below or above):
+            return None
 
-        ed_filename = "%s/data_table.csv" % (self.folder)
-        with open(ed_filename, mode='w', newline='') as f:
+        return "%d ix values below and %d above the fitted range %g, %g (%s)" \
+                % (below, above, self.f_beta.x[0], self.f_beta.x[-1], self.out_of_range)
 
-            fieldnames = dict_of_lists.keys()
-            writer = csv.DictWriter(f, fieldnames=fieldnames)
-            writer.writeheader()
+    @staticmethod
+    def _wait_ed(beta, hprim, h):
+
+        """ Wait's electron density formula, broadcasts over numpy arrays """
+
+        return 1.43e13*np.exp(-0.15*hprim)*np.exp((beta-0.15)*(h-hprim))
+
+    @staticmethod
+    def _wait_content(beta, hprim, h_low, h_high):
+
+        """ integral of Wait's electron density formula over heights
+        h_low to h_high [km], in electrons per m^2 of the column. The profile
+        is exponential in h, exp(k*(h - hprim)) with k = beta - 0.15, so the
+        integral is exp(k*(h_low - hprim))*(exp(k*(h_high - h_low)) - 1)/k,
+        which tends to h_high - h_low times the density for k -> 0 """
 
-            # convert dict with list values to list of dicts
-            list_of_dicts = [dict(zip(dict_of_lists, i)) for i in zip(*dict_of_lists.values())]
-            for d in list_of_dicts:
-                writer.writerow(d)
+        k = np.asarray(beta - 0.15, dtype=float)
+        width = h_high - h_low
+        with np.errstate(divide='ignore', invalid='ignore'):
+            growth = np.where(k != 0, np.expm1(k*width)/np.where(k != 0, k, 1), width)
+
+        return 1.0e3*1.43e13*np.exp(-0.15*hprim)*np.exp(k*(h_low - hprim))*growth
+
+    @staticmethod
+    def _content_name(h_low, h_high):
+
+        """ output column of the electron content between two heights """
+
+        return 'Electron Content(m^-2) %g-%gkm' % (h_low, h_high)
+
+    def _make_folder(self):
+
+        """ creates results folder on first write. The default timestamped
+        folder gets a -2, -3 ... suffix if a run started in the same second
+        has already created it, so runs never overwrite each other's results """
+
+        if self.folder == self._default_folder:
+            base, n = self.folder, 1
+            while True:
+                try:
+                    os.makedirs(self.folder)
+                    break
+                except FileExistsError:
+                    n += 1
+                    self.folder = "%s-%d" % (base, n)
+            self._default_folder = None
+        elif not os.path.exists(self.folder):
+            os.makedirs(self.folder)
+
+    @profiled('render_figure')
+    def _save_figure(self, plt, show):
+
+        """ saves current figure to the results folder, shows it only
+        when asked, closes it otherwise """
+
+        self._make_folder()
+        plt.savefig("%s/figure.png" % (self.folder))
+        self.profile.count('figures')
+        if show:
+            plt.show()
+        else:
+            plt.close()
+
+    def write_table(self, columns, output_format=None):
+
+        """ writes a dict of columns to the data table, times as datetime64 """
+
+        self._write_chunks([columns], output_format)
+
+    @profiled('write_table')
+    def _write_chunks(self, chunks, output_format=None):
+
+        """ writes an iterable of dicts of columns to the data table in the
+        given format (one of output_writers.WRITERS), chunks are written
+        column-wise as they come so only one is held in memory """
+
+        writer_class = WRITERS[output_format or self.output_format]
+
+        self._make_folder()
+        filename = "%s/data_table.%s" % (self.folder, writer_class.extension)
+        with writer_class(filename) as writer:
+            for columns in chunks:
+                writer.write(self._format_chunk(columns, writer_class.text))
+
+        self.profile.count('rows_written', writer.rows)
+        self.profile.count('bytes_written', writer.bytes_written)
+
+    def _format_chunk(self, columns, text=True):
+
+        """ prepares calculated columns for a writer, text formats
+        get formatted values where needed (see format_times) """
+
+        return format_times(columns, self.dated, text)
 
     @staticmethod
     def _extract_column(rows, column):
@@ -237,74 +913,340 @@ class Flared_t(Flared):
 
     """ Child class for flarED time series """
 
-    def __init__(self, h):
+    time_series = r"data/time_series.csv"
+
+    # number of time series rows processed at once in streaming mode
+    chunk_size = 100000
 
-        """ initializes parent constructor, sets input h parameter,
-        calculates ED's with flared and easyfit methods """
+    # figures show at most plot_points samples (None for all), picked from
+    # log(Ix) by plot_decimation (a decimate.METHODS name), so flare peaks
+    # are kept, markers are drawn for up to marker_points samples
+    plot_points = 10000
+    plot_decimation = 'lttb'
+    marker_points = 1000
 
-        super().__init__()
+    # data tables keep ED's on the delayed time axis (None), or resample
+    # them onto the flux time stamps ('ix') or onto a uniform grid of
+    # this many seconds, so ED and Ix in a row share a time
+    resample = None
+
+    # parsed time series are kept in a binary sidecar next to the csv
+    # (see flux_cache) and memory-mapped by later runs, False to always parse
+    flux_sidecar = True
+
+    def __init__(self, h, time_series=None, stream=False, segment=False,
+            workers=None, lookup=None, folder=None, subset=None, bootstrap=None):
+
+        """ initializes parent constructor, sets input h parameter (a single
+        height or a sequence of heights for a time x height cube),
+        calculates ED's with flared and easyfit methods, in stream mode
+        nothing is calculated until the chunks are consumed. With segment
+        the series is split into flare events, each with its own time delay.
+        With bootstrap the output has confidence bands of ED, beta and h',
+        the refits spread across workers processes """
+
+        super().__init__(lookup, folder, subset, bootstrap, workers)
         self.h = h
-        self.ed_list, self.ix_list, self.beta_list, self.hprim_list, \
-                self.timestamp_list, self.timestamp_delta_list = self._calculate_flared()
-        self.ed_easy_list = self._calculate_easyfit(self.ix_list)
+        self.heights = np.atleast_1d(h)
+        self.segment = segment
+        self.events = []
+        self._dated = None
+        if time_series is not None:
+            self.time_series = time_series
+        if not stream:
+            self.ed_cube, self.ix_list, self.beta_list, self.hprim_list, \
+                    self.timestamp_list, self.timestamp_delta_list = self._calculate_flared()
+            self.ed_easy_cube = self._calculate_easyfit_cube(self.ix_list)
+            self.ed_list = self.ed_cube[:, 0]
+            self.ed_easy_list = self.ed_easy_cube[:, 0]
 
-    def write_and_plot(self):
+    def results(self):
 
-        """ method which invokes writing and plotting methods """
-        timestamp_list_hms = []
-        for t in self.timestamp_list:
-            timestamp_list_hms += [t.strftime("%H:%M:%S")]
+        """ compute-only output, returns calculated values as a dict of arrays """
 
-        timestamp_delta_list_hms = []
-        for t in self.timestamp_delta_list:
-            timestamp_delta_list_hms += [t.strftime("%H:%M:%S")]
-        
+        return self._columns(self.timestamp_list, np.asarray(self.ix_list),
+                self.timestamp_delta_list, self.ed_cube, self.ed_easy_cube,
+                np.asarray(self.beta_list), np.asarray(self.hprim_list))
 
-        # write data to a csv file
-        self._write_to_csv({
-                    'Height(km)': [self.h]*len(self.timestamp_list),
-                    'Time(Ix) (H:M:S)': timestamp_list_hms,
-                    'Solar Flux Ix (W*m^-2)': self.ix_list,
-                    'Time(ED) (H:M:S)': timestamp_delta_list_hms,
-                    'Electron Density(m^-3)': self.ed_list,
-                    'Electron Density(m^-3) easyfit': self.ed_easy_list,
-                    'Beta(km^-1)': self.beta_list,
-                    "H'(km)": self.hprim_list})
+    def write_and_plot(self, plot=True, show=False, output_format=None):
+
+        """ method which invokes writing and plotting methods """
+
+        # write data table
+        self._write_chunks(self._resampled([self.results()]), output_format)
 
         # plot data
-        self.plot()
+        if plot:
+            self.plot(show)
+
+    def write_stream(self, chunk_size=None, output_format=None):
+
+        """ calculates and writes the time series chunk by chunk,
+        memory use is bounded by the chunk size, not the input length """
+
+        self._write_chunks(self._resampled(self.iter_chunks(chunk_size)),
+                output_format)
+
+    def _resampled(self, chunks):
+
+        """ calculated chunks resampled as set by resample, unchanged when
+        it is None """
+
+        if self.resample is None:
+            yield from chunks
+            return
+
+        resampler = self.resampler()
+        for chunk in chunks:
+            with self.profile.stage('resample'):
+                rows = resampler.feed(chunk)
+            if len(rows['Time']):
+                yield rows
+        with self.profile.stage('resample'):
+            yield resampler.flush()
+
+    def resampler(self):
+
+        """ Resampler of calculated chunks for the resample setting """
 
-    def plot(self):
+        return Resampler(None if self.resample == 'ix' else float(self.resample))
+
+    def iter_chunks(self, chunk_size=None):
+
+        """ generator of calculated chunks of the time series,
+        each chunk is a dict of arrays as returned by results() """
+
+        chunk_size = chunk_size or self.chunk_size
+
+        # for ED values we incorporate time delay due to the
+        # slughiness of the ionosphere, based on statistics of SF events,
+        # peak ix (or events) are found in a first pass over the file
+        detector = EventDetector()
+        ix_max = 0
+        for stamps, ix in self._read_time_series(chunk_size):
+            ix_max = np.max(ix, initial=ix_max, where=~np.isnan(ix))
+            if self.segment:
+                detector.update(ix)
+        self.events = detector.all_events()
+
+        start = 0
+        for times, ix in self._read_time_series(chunk_size):
+            delays = self._delays(start, len(ix), ix_max)
+            start += len(ix)
+            ed_matrix, beta, hprim = self.calculate_ed(ix, self.heights)
+            yield self._columns(times, ix, delay_times(times, delays),
+                    ed_matrix, self._calculate_easyfit_cube(ix), beta, hprim)
+
+    def _columns(self, timestamps, ix, timestamps_delta, ed_matrix, ed_easy_matrix,
+            beta, hprim):
+
+        """ output columns for a block of the series, a single height gives
+        one ED column per method, a cube gives one per method and height """
+
+        columns = {}
+        if len(self.heights) == 1:
+            columns['Height(km)'] = np.full(len(ix), self.heights[0])
+        columns['Time(Ix)'] = timestamps
+        columns['Solar Flux Ix (W*m^-2)'] = ix
+        columns['Time(ED)'] = timestamps_delta
+        if len(self.heights) == 1:
+            columns['Electron Density(m^-3)'] = ed_matrix[:, 0]
+            columns['Electron Density(m^-3) easyfit'] = ed_easy_matrix[:, 0]
+        else:
+            for i, h in enumerate(self.heights):
+                columns['Electron Density(m^-3) %gkm' % h] = ed_matrix[:, i]
+            for i, h in enumerate(self.heights):
+                columns['Electron Density(m^-3) easyfit %gkm' % h] = ed_easy_matrix[:, i]
+        columns['Beta(km^-1)'] = beta
+        columns["H'(km)"] = hprim
+        if self.content_heights is not None:
+            columns[self._content_name(*self.content_heights)] = \
+                    self._wait_content(beta, hprim, *self.content_heights)
+
+        if self.bands is not None:
+            for h in self.heights:
+                name = 'Electron Density(m^-3)' if len(self.heights) == 1 \
+                        else 'Electron Density(m^-3) %gkm' % h
+                columns['%s lower' % name], columns['%s upper' % name] = \
+                        self.bands.ed(ix, h)
+            columns['Beta(km^-1) lower'], columns['Beta(km^-1) upper'] = \
+                    self.bands.beta(ix)
+            columns["H'(km) lower"], columns["H'(km) upper"] = self.bands.hprim(ix)
+
+        return columns
+
+    def _format_chunk(self, chunk, text=True):
+
+        """ timestamps of a calculated chunk as datetime64, or formatted
+        for text formats (see format_times) """
+
+        return format_times(chunk, self._has_dates(), text)
+
+    def _has_dates(self):
+
+        """ whether the time series has ISO dates, or times of day only,
+        decided by its first row """
+
+        if self._dated is None:
+            with open(self.time_series) as a_file:
+                reader = csv.reader(a_file)
+                header = next(reader, None)
+                row = next(reader, None)
+            self._dated = row is not None and '-' in row[0]
+
+        return self._dated
+
+    def _read_time_series(self, chunk_size):
+
+        """ reads the time series in blocks of chunk_size rows, yields
+        datetime64 timestamps and an array of ix's for each block. The
+        blocks come from the sidecar when it is up to date, otherwise the
+        csv is parsed and the sidecar written along the way """
+
+        records = flux_cache.load(self.time_series) if self.flux_sidecar else None
+        if records is not None:
+            self.profile.count('sidecar_hits')
+            for start in range(0, len(records), chunk_size):
+                with self.profile.stage('read_time_series'):
+                    block = records[start:start + chunk_size]
+                    chunk = block['time'].view('datetime64[us]'), block['ix']
+                self.profile.count('rows_read', len(block))
+                yield chunk
+            return
+
+        sidecar = None
+        if self.flux_sidecar:
+            try:
+                sidecar = flux_cache.SidecarWriter(self.time_series)
+            except OSError as e:
+                print(e)
+
+        complete = False
+        try:
+            for chunk in self._parse_time_series(chunk_size):
+                if sidecar is not None:
+                    sidecar.write(*chunk)
+                yield chunk
+            complete = True
+        finally:
+            if sidecar is not None:
+                if complete:
+                    sidecar.close()
+                else:
+                    sidecar.abort()
+
+    def _parse_time_series(self, chunk_size):
+
+        """ parses the time series csv in blocks of chunk_size rows """
+
+        # last time of day of the previous block, to carry midnight
+        # rollovers of times without dates across blocks
+        last = None
+        with open(self.time_series) as a_file:
+            reader = csv.reader(a_file)
+            header = next(reader, None)
+            while True:
+                with self.profile.stage('read_time_series'):
+                    rows = list(islice(reader, chunk_size))
+                    times = parse_times(self._extract_column(rows, 0), last)
+                    chunk = times, self._parse_flux(
+                            [row[1] if len(row) > 1 else '' for row in rows])
+                if not rows:
+                    break
+                last = times[-1]
+                self.profile.count('rows_read', len(rows))
+                yield chunk
+
+    @staticmethod
+    def _parse_flux(cells):
+
+        """ parses flux cells to floats, blank or non-numeric cells give nan
+        (and are then handled like any other nan ix) """
+
+        try:
+            return np.array(cells, dtype=float)
+        except ValueError:
+            pass
+
+        # only chunks with a bad cell get here, blanks are masked at once,
+        # anything else left is converted cell by cell
+        cells = np.char.strip(np.asarray(cells, dtype=str))
+        cells[cells == ''] = 'nan'
+        try:
+            return cells.astype(float)
+        except ValueError:
+            return np.array([_float_or_nan(cell) for cell in cells])
+
+    def _load_time_series(self):
+
+        """ whole time series as datetime64 timestamps and ix's,
+        memory-mapped from an up to date sidecar """
+
+        records = flux_cache.load(self.time_series) if self.flux_sidecar else None
+        if records is not None:
+            self.profile.count('sidecar_hits')
+            self.profile.count('rows_read', len(records))
+            return records['time'].view('datetime64[us]'), records['ix']
+
+        chunks = list(self._read_time_series(self.chunk_size))
+        if not chunks:
+            return np.empty(0, 'datetime64[us]'), np.empty(0)
+
+        return tuple(np.concatenate(columns) for columns in zip(*chunks))
+
+    def _delays(self, start, n, ix_max):
+
+        """ time delays [min] for n samples from index start, each sample
+        gets the delay of its own event, without events all samples get
+        the delay of the peak ix of the whole series """
+
+        if not self.events:
+            return np.full(n, delta_t(ix_max))
+
+        delays = delta_t(np.array([e.ix_peak for e in self.events]))
+        return delays[segment_indices(self.events, start, n)]
+
+    def plot(self, show=False):
 
         """ plots and saves a figure """
 
-        # convert to times suitable for plotting
-        x = matplotlib.dates.date2num(self.timestamp_list)
-        x_delta = matplotlib.dates.date2num(self.timestamp_delta_list)
+        plt = _pyplot(show)
+        import matplotlib.dates
 
-        y = self.ed_list
-        y_easy = self.ed_easy_list
-        y_ix = self.ix_list
+        if len(self.heights) > 1:
+            return self._plot_cube(plt, show)
+
+        # convert to times suitable for plotting, of the samples kept
+        kept = self._plot_samples()
+        x = matplotlib.dates.date2num(self.timestamp_list[kept])
+        x_delta = matplotlib.dates.date2num(self.timestamp_delta_list[kept])
+
+        y = self.ed_list[kept]
+        y_easy = self.ed_easy_list[kept]
+        y_ix = self.ix_list[kept]
 
         # plot flared and easyfit ed's as y(log)
         # plot ix's as y2(log)
         # plot times as x
         fig, ax = plt.subplots()
         ax.set_yscale('log')
-        lns1 = ax.plot(x_delta, y, '-o', color="thistle", markersize=4,
-                mec='blue', mfc='white', label="flarED method")
-        lns2 = ax.plot(x_delta, y_easy, '-o', color="thistle", markersize=4,
-                mec='red', mfc='white', label="easyFit method")
+        lns1 = ax.plot(x_delta, y, '-', label="flarED method",
+                **self._line_style(len(kept), 'blue'))
+        lns2 = ax.plot(x_delta, y_easy, '-', label="easyFit method",
+                **self._line_style(len(kept), 'red'))
 
         plt.title(r"H=%s km" %(self.h))
-        myFmt = matplotlib.dates.DateFormatter('%H:%M')
-        plt.gca().xaxis.set_major_formatter(myFmt)
+        plt.gca().xaxis.set_major_formatter(self._time_formatter(plt.gca().xaxis))
 
         ax.set_xlabel(r"time $[\mathrm{h:m}]$", fontdict=self.font)
         ax.set_ylabel(r"Electron Density $[\mathrm{m^{-3}}]$", fontdict=self.font)
 
         ax2=ax.twinx()
         lns3 = ax2.plot(x, y_ix, '-', color="purple", markersize=4, label="Ix")
+        if len(kept) > self.marker_points:
+            # dense lines, ED's are drawn over Ix
+            ax.set_zorder(ax2.get_zorder() + 1)
+            ax.patch.set_visible(False)
         ax2.set_ylabel(r"Flux Intensity $[\mathrm{W*m^{-2}}]$", fontdict=self.font)
         ax2.set_yscale('log')
 
@@ -312,113 +1254,163 @@ class Flared_t(Flared):
         labs = [l.get_label() for l in lns]
         ax.legend(lns, labs, loc=0)
 
-        plt.savefig("%s/figure.png" % (self.folder))
-        plt.show()
+        self._save_figure(plt, show)
+
+    def _line_style(self, n, color):
+
+        """ ED line of n samples, marked with color up to marker_points
+        samples, drawn in color beyond """
+
+        if n <= self.marker_points:
+            return dict(marker='o', color="thistle", markersize=4, mec=color, mfc='white')
+        return dict(color=color, linewidth=0.8)
+
+    @profiled('decimate')
+    def _plot_samples(self):
+
+        """ indices of the samples shown in figures, decimated on log(Ix)
+        over time (ED's rise and fall with Ix, so their peaks are kept too) """
+
+        n = len(self.ix_list)
+        if not self.plot_points or n <= self.plot_points:
+            return np.arange(n)
+
+        kept = DECIMATION[self.plot_decimation](
+                self.timestamp_list.astype('datetime64[us]').astype(float),
+                np.log10(self.ix_list), self.plot_points)
+        self.profile.count('plot_samples', len(kept))
+
+        return kept
+
+    def _plot_cube(self, plt, show):
+
+        """ plots time x height cube of flarED ED's as a color map """
+
+        import matplotlib.dates
+
+        kept = self._plot_samples()
+        x_delta = matplotlib.dates.date2num(self.timestamp_delta_list[kept])
+
+        fig, ax = plt.subplots()
+        mesh = ax.pcolormesh(x_delta, self.heights, np.log10(self.ed_cube[kept].T),
+                shading='nearest')
+        cbar = fig.colorbar(mesh, ax=ax)
+        cbar.set_label(r"log Electron Density $[\mathrm{m^{-3}}]$", fontdict=self.font)
+
+        plt.title(r"H=%g-%g km" %(self.heights[0], self.heights[-1]))
+        ax.xaxis.set_major_formatter(self._time_formatter(ax.xaxis))
+
+        ax.set_xlabel(r"time $[\mathrm{h:m}]$", fontdict=self.font)
+        ax.set_ylabel(r"Height $[\mathrm{km}]$", fontdict=self.font)
+
+        self._save_figure(plt, show)
+
+    def _time_formatter(self, axis):
 
+        """ H:M tick labels for times of day, concise dates for a dated series """
+
+        import matplotlib.dates
+
+        if self._has_dates():
+            return matplotlib.dates.ConciseDateFormatter(axis.get_major_locator())
+        return matplotlib.dates.DateFormatter('%H:%M')
+
+    @profiled('calculate_flared')
     def _calculate_flared(self):
 
         """ calculate ED's with flarED method """
 
-        # open with times, ix's and control ed values
-        a_file = open("data/time_series.csv")
-        reader = csv.reader(a_file)
-        header = next(reader, None)
-        rows = list(reader)
-        a_file.close()
-
-        ix_list = self._extract_column(rows, 1)
-        ix_list = [float(i) for i in ix_list]
+        # times and ix's, parsed or memory-mapped from the sidecar
+        times, ix_list = self._load_time_series()
 
         # for ED values we incorporate time delay due to the
         # slughiness of the ionosphere, based on statistics of SF events
-        stamps = self._extract_column(rows, 0)
-        timestamp_list = [datetime.strptime(a, '%H:%M') for a in stamps]
-        delta_t = 0.45385 + (-0.44863*math.log10(max(ix_list, 
-            key=lambda x:float(x))))
-        timestamp_delta_list = []
-        for t in timestamp_list: 
-            timestamp_delta_list += [t+timedelta(minutes=delta_t)]
+        if self.segment:
+            with self.profile.stage('detect_events'):
+                self.events = detect_events(ix_list)
+        delays = self._delays(0, len(ix_list),
+                np.max(ix_list, initial=0, where=~np.isnan(ix_list)))
+        timestamp_list = times
+        timestamp_delta_list = delay_times(times, delays)
 
         # control ed values, used for comparison
         #ed_control = self._extract_column(rows, 2)
         #ed_control = [float(i) for i in ed_control]
 
-        ed_list = []
-        beta_list = []
-        hprim_list = []
-
-        # if ix values are out of range, apply fixed beta and hprim
-        # calculate ED's for given parameters
-        for ix in ix_list:
-            if ix<8e-07:
-                beta = min(self.f_beta(ix))
-                hprim = min(self.f_hprim(ix))
-            else:
-                beta = float(self.f_beta(ix))
-                hprim = float(self.f_hprim(ix))
-            beta_list.append(beta)
-            hprim_list.append(hprim)
-            ed_list.append(1.43*10**13*math.exp(-0.15*hprim)*\
-                    math.exp((beta-0.15)*(self.h-hprim)))
-
-        return ed_list, ix_list, beta_list, hprim_list, timestamp_list, timestamp_delta_list
-
-    def _calculate_easyfit(self, ixs):
-
-        """ calculate ED's with easyfit method """
+        # calculate ED's for the whole series at all heights
+        ed_matrix, beta_list, hprim_list = self.calculate_ed(ix_list, self.heights)
 
-        # find a row with a matching h
-        with open("data/easyfit.csv", 'r') as a_file:
-            reader = csv.reader(a_file)
-            rows = list(reader)
-            matched_row = [row for row in rows if row[0] == str(self.h)][0]
+        return ed_matrix, ix_list, beta_list, hprim_list, timestamp_list, timestamp_delta_list
 
-        matched_row = [float(i) for i in matched_row]
-        ed_list=[]
+    def _calculate_easyfit_cube(self, ixs):
 
-        # calculate ED's for given parameters
-        for ix in ixs:
-            ed_list.append(10**(matched_row[1]+matched_row[2]*math.log10(ix)+\
-                    matched_row[3]*math.log10(ix)**2))
+        """ calculate easyfit ED's at all heights, returns (ix x h) matrix """
 
-        return ed_list
+        return self.calculate_easyfit(ixs, self.heights)
 
 class Flared_h(Flared):
 
     """ Child class for flarED altitude profile for a given solar flux intensity """
 
-    def __init__(self, ix):
+    def __init__(self, ix, lookup=None, subset=None, bootstrap=None):
 
         """ initializes parent constructor + sets input ix parameter,
-        calculates ED's with flared and easyfit methods """
+        calculates ED's with flared and easyfit methods, with bootstrap
+        along with confidence bands """
 
 
-        super().__init__()
+        super().__init__(lookup, subset=subset, bootstrap=bootstrap)
         self.ix = ix
         self.ed_list, self.h_list, self.beta, self.hprim = self._calculate_flared()
         self.ed_easy_list, self.h_easy_list = self._calculate_easyfit()
 
 
-    def write_and_plot(self):
+    def results(self):
+
+        """ compute-only output, returns calculated values as a dict of arrays """
+
+        columns = {'Height(km)': np.asarray(self.h_list),
+                'Electron Density(m^-3)': np.asarray(self.ed_list),
+                'Electron Density(m^-3) easyfit': np.asarray(self.ed_easy_list),
+                'Solar Flux(W*m^-2)': np.full(len(self.ed_list), self.ix),
+                'Beta(km^-1)': np.full(len(self.ed_list), self.beta),
+                "H'(km)": np.full(len(self.ed_list), self.hprim)}
+        if self.content_heights is not None:
+            columns[self._content_name(*self.content_heights)] = np.full(
+                    len(self.ed_list), self._wait_content(self.beta, self.hprim,
+                        *self.content_heights))
+
+        if self.bands is not None:
+            n = len(self.ed_list)
+            columns['Electron Density(m^-3) lower'], \
+                    columns['Electron Density(m^-3) upper'] = \
+                    self.bands.ed_profile(self.ix, self.h_list)
+            (beta_lower,), (beta_upper,) = self.bands.beta([self.ix])
+            (hprim_lower,), (hprim_upper,) = self.bands.hprim([self.ix])
+            columns['Beta(km^-1) lower'] = np.full(n, beta_lower)
+            columns['Beta(km^-1) upper'] = np.full(n, beta_upper)
+            columns["H'(km) lower"] = np.full(n, hprim_lower)
+            columns["H'(km) upper"] = np.full(n, hprim_upper)
+
+        return columns
+
+    def write_and_plot(self, plot=True, show=False, output_format=None):
 
         """ method which calls writing and plotting methods """
 
-        # write data to a csv file
-        self._write_to_csv({
-                    'Height(km)': [int(a) for a in self.h_list],
-                    'Electron Density(m^-3)': self.ed_list,
-                    'Electron Density(m^-3) easyfit': self.ed_easy_list,
-                    'Solar Flux(W*m^-2)': [self.ix]*len(self.ed_list),
-                    'Beta(km^-1)': [self.beta]*len(self.ed_list),
-                    "H'(km)": [self.hprim]*len(self.ed_list)})
+        # write data table
+        self.write_table(self.results(), output_format)
 
         # plot data
-        self.plot()
+        if plot:
+            self.plot(show)
 
-    def plot(self):
+    def plot(self, show=False):
 
         """ plots and saves a figure """
 
+        plt = _pyplot(show)
+
         x = self.h_list
         y = self.ed_list
         y_easy = self.ed_easy_list
@@ -429,6 +1421,10 @@ class Flared_h(Flared):
                 mec='blue', mfc='white', label="flarED method")
         plt.plot(x, y_easy, '-o', color="purple", markersize=4,
                 mec='red', mfc='white', label="easyFit method")
+        if self.bands is not None:
+            lower, upper = self.bands.ed_profile(self.ix, x)
+            plt.fill_between(x, lower, upper, color="thistle", alpha=0.4,
+                    label="flarED %g%% band" % (100*self.bands.level))
 
         plt.title(r"Ix=%.2E $[\mathrm{W*m^{-2}}$], $\mathrm{\beta}$=%.2E $\mathrm{[km^{-1}]}$, H'=%.2f $[\mathrm{km}]$" \
                 %(Decimal(self.ix), Decimal(self.beta), self.hprim), fontdict=self.font)
@@ -436,25 +1432,21 @@ class Flared_h(Flared):
         plt.xlabel(r"Height $[\mathrm{km}]$", fontdict=self.font)
         plt.ylabel(r"Electron Density $[\mathrm{m^{-3}}]$", fontdict=self.font)
 
-        plt.savefig("%s/figure.png" % (self.folder))
-        plt.show()
+        self._save_figure(plt, show)
 
+    @profiled('calculate_flared')
     def _calculate_flared(self):
 
         """ calculate ED's with flarED method """
 
-        beta = float(self.f_beta(self.ix))
-        hprim = float(self.f_hprim(self.ix))
-
-        ed_list=[]
-
         # for a fixed range of h's from 50-90
         h_list = np.arange(50,91)
 
         # calculate electron density values
-        for h in np.nditer(h_list):
-            ed_list.append(1.43*10**13*math.exp(-0.15*hprim)*\
-                    math.exp((beta-0.15)*(h-hprim)))
+        ed_matrix, beta, hprim = self.calculate_ed(self.ix, h_list)
+        ed_list = ed_matrix[0]
+        beta = float(beta[0])
+        hprim = float(hprim[0])
 
         return ed_list, h_list, beta, hprim
 
@@ -462,18 +1454,8 @@ class Flared_h(Flared):
 
         """ calculate ED's with easyfit method """
 
-        a_file = open("data/easyfit.csv")
-        reader = csv.reader(a_file, quoting=csv.QUOTE_NONNUMERIC)
-        header = next(reader, None)
-        rows = list(reader)
-
-        ed_list = []
-
-        # extract first column of each row
-        h_list = self._extract_column(rows, 0)
-
-        for row in rows:
-            ed_list.append(10**(row[1]+row[2]*math.log10(self.ix)+\
-                    row[3]*math.log10(self.ix)**2))
+        # heights of the easyfit table
+        h_list = self._load_easyfit()[0]
+        ed_list = self.calculate_easyfit(self.ix, h_list)[0]
 
         return ed_list, h_list
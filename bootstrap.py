@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+
+""" Bootstrap confidence bands of the fitted beta and h' curves. The flares
+rows are resampled with replacement, averaged per ix and refitted like the
+model. The refits are batched: the Vandermonde matrix of all distinct ix's
+is built once, a replicate masks the ix's it didn't draw, and the least
+squares problems of a whole block of replicates are solved by one stacked
+pseudo-inverse, for beta and h' at once. Blocks are spread across processes """
+
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+# replicates solved by a single stacked pseudo-inverse
+BLOCK = 500
+
+def _scaled_lstsq(vander, mask, values):
+
+    """ least squares polynomial coefficients of a stack of masked fits,
+    scaled and truncated as np.polyfit does. vander is (ix x deg+1), mask
+    (replicates x ix) and values (replicates x ix x rhs) """
+
+    lhs = vander[None]*mask[..., None]
+    scale = np.sqrt((lhs*lhs).sum(axis=1))
+    scale[scale == 0] = 1
+    lhs /= scale[:, None, :]
+    rcond = mask.sum(axis=1)*np.finfo(float).eps
+
+    # the pseudo-inverse of lhs from the small square R of its QR
+    # decomposition, R has the same singular values as lhs
+    q, r = np.linalg.qr(lhs)
+    coefficients = np.linalg.pinv(r, rcond=rcond) @ (q.transpose(0, 2, 1)
+            @ (values*mask[..., None]))
+
+    return coefficients/scale[..., None]
+
+def _bootstrap_block(x, groups, beta, hprim, settings, grids, replicates, seed):
+
+    """ beta and h' curves on the grids (poly part and tail) for a block
+    of replicates, as two (replicates x grid points) arrays """
+
+    rng = np.random.default_rng(seed)
+    n, k = len(groups), len(x)
+
+    # per replicate sums and counts of the drawn rows of every ix
+    drawn = rng.integers(0, n, size=(replicates, n))
+    bins = (np.arange(replicates)[:, None]*k + groups[drawn]).ravel()
+    counts = np.bincount(bins, minlength=replicates*k).reshape(replicates, k)
+    sums = np.stack([np.bincount(bins, weights=values[drawn].ravel(),
+        minlength=replicates*k).reshape(replicates, k) for values in (beta, hprim)], -1)
+
+    mask = counts > 0
+    averages = sums/np.maximum(counts, 1)[..., None]
+
+    curves = []
+    for deg, grid in zip((settings['poly_deg'], settings['tail_deg']), grids):
+        vander = np.vander(x, deg + 1)
+        coefficients = _scaled_lstsq(vander, mask, averages)
+        curves.append(np.vander(grid, deg + 1) @ coefficients)
+
+    curves = np.concatenate(curves, axis=1)
+    return curves[..., 0], curves[..., 1]
+
+def bootstrap_curves(query, settings, grids, replicates, seed=0, workers=None):
+
+    """ beta and h' curves of replicates refits of (ix, beta, h') rows,
+    evaluated on the grids of the model, as (replicates x points) arrays """
+
+    rows = np.asarray(query, dtype=float)
+    x, groups = np.unique(rows[:, 0], return_inverse=True)
+    beta, hprim = rows[:, 1], rows[:, 2]
+
+    sizes = [min(BLOCK, replicates - start) for start in range(0, replicates, BLOCK)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    blocks = [(x, groups, beta, hprim, settings, grids, size, block_seed)
+            for size, block_seed in zip(sizes, seeds)]
+
+    workers = min(workers or os.cpu_count() or 1, len(blocks))
+    if workers > 1:
+        with ProcessPoolExecutor(workers) as pool:
+            results = list(pool.map(_bootstrap_block, *zip(*blocks)))
+    else:
+        results = [_bootstrap_block(*block) for block in blocks]
+
+    return tuple(np.concatenate(curves) for curves in zip(*results))
+
+class Bands:
+
+    """ confidence bands of beta, h' and ED as functions of ix, the
+    percentiles of the replicate curves at the model grid points are
+    interpolated in ix the same way as the fitted curves, ix's outside of
+    the grid are handled by out_of_range (one of Flared.OUT_OF_RANGE) """
+
+    def __init__(self, xpoly, beta_curves, hprim_curves, wait_ed, level=0.95,
+            out_of_range='clamp'):
+
+        self.xpoly = xpoly
+        self.level = level
+        self.out_of_range = out_of_range
+        self.replicates = len(beta_curves)
+        self._beta_curves = beta_curves
+        self._hprim_curves = hprim_curves
+        self._wait_ed = wait_ed
+        self._percentiles = 50*(1 - level), 50*(1 + level)
+
+        self._beta = np.percentile(beta_curves, self._percentiles, axis=0)
+        self._hprim = np.percentile(hprim_curves, self._percentiles, axis=0)
+        self._ed = {}
+
+    def _interpolate(self, band, ix):
+
+        ix = np.asarray(ix, dtype=float)
+        clamped = np.clip(ix, self.xpoly[0], self.xpoly[-1])
+        return tuple(self._outside(ix, np.interp(clamped, self.xpoly, curve), curve)
+                for curve in band)
+
+    def _outside(self, ix, values, curves):
+
+        """ values interpolated at the clamped ix's from curves (knots along
+        the last axis), set to nan or extrapolated linearly in log10(ix) from
+        the end knots where ix is outside of the grid, as the fitted curves """
+
+        x = self.xpoly
+        below, above = ix < x[0], ix > x[-1]
+        if self.out_of_range == 'clamp' or not (below.any() or above.any()):
+            return values
+
+        if self.out_of_range == 'nan':
+            values[..., below | above] = np.nan
+        elif self.out_of_range == 'extrapolate':
+            with np.errstate(divide='ignore', invalid='ignore'):
+                for outside, end, inner in ((below, 0, 1), (above, -1, -2)):
+                    du = np.log10(ix[outside]) - np.log10(x[end])
+                    du[ix[outside] <= 0] = np.nan
+                    step = np.log10(x[end]) - np.log10(x[inner])
+                    values[..., outside] += du*(curves[..., [end]] - curves[..., [inner]])/step
+
+        return values
+
+    def beta(self, ix):
+
+        """ lower and upper beta at ix's """
+
+        return self._interpolate(self._beta, ix)
+
+    def hprim(self, ix):
+
+        """ lower and upper h' at ix's """
+
+        return self._interpolate(self._hprim, ix)
+
+    def _replicates_at(self, ix):
+
+        """ beta and h' of every replicate at ix's, (replicates x ix) arrays """
+
+        ix = np.atleast_1d(np.asarray(ix, dtype=float))
+        clamped = np.clip(ix, self.xpoly[0], self.xpoly[-1])
+        j = np.clip(np.searchsorted(self.xpoly, clamped) - 1, 0, len(self.xpoly) - 2)
+        w = (clamped - self.xpoly[j])/(self.xpoly[j + 1] - self.xpoly[j])
+
+        return [self._outside(ix, (1 - w)*curves[:, j] + w*curves[:, j + 1], curves)
+                for curves in (self._beta_curves, self._hprim_curves)]
+
+    def ed_profile(self, ix, heights):
+
+        """ lower and upper ED at a single ix over heights, from the
+        replicates evaluated at ix """
+
+        beta, hprim = self._replicates_at(ix)
+        ed = self._wait_ed(beta, hprim, np.asarray(heights)[None, :])
+
+        return np.percentile(ed, self._percentiles, axis=0)
+
+    def ed(self, ix, h):
+
+        """ lower and upper ED at ix's and height h, interpolated in log(ED) """
+
+        if h not in self._ed:
+            ed = self._wait_ed(self._beta_curves, self._hprim_curves, h)
+            self._ed[h] = np.percentile(np.log(ed), self._percentiles, axis=0)
+        lower, upper = self._interpolate(self._ed[h], ix)
+
+        return np.exp(lower), np.exp(upper)
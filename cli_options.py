@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+
+""" Command line options shared by the flarED scripts, with their
+validation, so every script spells and checks them the same way """
+
+import json
+import math
+from datetime import date
+from Flared import Flared, Subset, OUT_OF_RANGE
+from output_writers import WRITERS
+from resample import resample_step
+from fit_backends import BACKENDS
+from Range import Range
+
+# altitudes the model is valid for
+HEIGHT_RANGE = Range(50, 90)
+
+def add_heights(parser):
+
+    """ a single altitude (-he) or a range of them (--heights), one of
+    the two is required """
+
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("-he", "--height", type=int, default=None,
+            choices=[HEIGHT_RANGE], help="Altitudes [km]")
+    group.add_argument("--heights", type=float, nargs=3, default=None,
+            metavar=("START", "END", "STEP"),
+            help="Range of altitudes [km] for a time x height cube, END included")
+
+def expand_heights(parser, args):
+
+    """ the altitude of -he, or the altitudes of --heights from START by
+    STEP, END included only when a whole number of steps reaches it.
+    Exits through parser.error unless all of them are in range """
+
+    if args.heights is None:
+        return args.height
+
+    start, end, step = args.heights
+    heights = [start + i*step for i in
+            range(int(math.floor((end - start)/step + 1e-9)) + 1)] \
+            if step > 0 else []
+    if not heights or not all(h in HEIGHT_RANGE for h in heights):
+        parser.error("argument --heights: heights must be %s" % HEIGHT_RANGE)
+
+    return heights
+
+def add_lookup(parser):
+
+    """ lookup table evaluation of the model, of SIZE nodes """
+
+    parser.add_argument("--lookup", type=int, nargs="?", const=4096, default=None,
+            metavar="SIZE", help="Evaluate beta and h' of single Ix values from a "
+            "log-spaced lookup table")
+
+def add_profile(parser):
+
+    """ json report of the run's profiler """
+
+    parser.add_argument("--profile", nargs="?", const="-", default=None,
+            metavar="FILE", help="Write a json report of stage timings, counters "
+            "and peak memory to FILE (stdout if omitted)")
+
+def write_profile(args, profile):
+
+    """ writes the report of profile to the --profile file (stdout for
+    '-'), nothing without --profile """
+
+    if args.profile is None:
+        return
+
+    report = json.dumps(profile.report(), indent=2)
+    if args.profile == "-":
+        print(report)
+    else:
+        with open(args.profile, 'w') as out:
+            out.write(report)
+
+def add_subset(parser):
+
+    """ filters of the flares the model is fitted on """
+
+    parser.add_argument("--transmitter", nargs="+", default=None,
+            help="Fit the model on flares recorded by these transmitters only")
+    parser.add_argument("--date-from", type=date.fromisoformat, default=None,
+            metavar="DATE", help="Fit the model on flares from this date on (YYYY-MM-DD)")
+    parser.add_argument("--date-to", type=date.fromisoformat, default=None,
+            metavar="DATE", help="Fit the model on flares up to this date (YYYY-MM-DD)")
+    parser.add_argument("--flare-class", nargs="+", default=None, metavar="CLASS",
+            help="Fit the model on flares of these classes only (C, M, X)")
+    parser.add_argument("--class-from", default=None, metavar="CLASS",
+            help="Fit the model on flares of this class on, with its magnitude (C5)")
+    parser.add_argument("--class-to", default=None, metavar="CLASS",
+            help="Fit the model on flares up to this class, with its magnitude (M2)")
+
+def subset(args):
+
+    """ Subset of the flares table selected by the filter options """
+
+    return Subset(args.transmitter, args.date_from, args.date_to, args.flare_class,
+            args.class_from, args.class_to)
+
+def add_format(parser, choices=None,
+        help="Format of the data table, npz and npy are numpy binary"):
+
+    """ data table format, any of the writers unless choices are given """
+
+    parser.add_argument("--format", default="csv",
+            choices=sorted(WRITERS if choices is None else choices), help=help)
+
+def add_bootstrap(parser):
+
+    """ confidence bands from bootstrap refits of the model """
+
+    parser.add_argument("--bootstrap", type=int, default=None, metavar="N",
+            help="Add confidence bands from N bootstrap refits of the model")
+    parser.add_argument("--confidence", type=float, default=Flared.confidence,
+            help="Confidence level of the bootstrap bands")
+
+def check_bootstrap(parser, args):
+
+    """ exits through parser.error unless --bootstrap is at least 1 and
+    --confidence is between 0 and 1 """
+
+    if args.bootstrap is not None and args.bootstrap < 1:
+        parser.error("argument --bootstrap: must be at least 1")
+    if not 0 < args.confidence < 1:
+        parser.error("argument --confidence: must be between 0 and 1")
+
+def add_out_of_range(parser):
+
+    """ policy for ix's outside of the fitted range """
+
+    parser.add_argument("--out-of-range", default=Flared.out_of_range,
+            choices=OUT_OF_RANGE, help="Handling of Ix values outside of the "
+            "fitted range: clamped, extrapolated in log(Ix) or nan")
+
+def add_content(parser):
+
+    """ electron content column between two altitudes """
+
+    parser.add_argument("--content", type=float, nargs=2, default=None,
+            metavar=("LOW", "HIGH"), help="Add the electron content [m^-2] of the "
+            "column between altitudes LOW and HIGH [km]")
+
+def check_content(parser, args):
+
+    """ exits through parser.error unless --content is LOW < HIGH, both
+    in range, returns the pair (None without --content) """
+
+    if args.content is not None and not (args.content[0] < args.content[1]
+            and all(h in HEIGHT_RANGE for h in args.content)):
+        parser.error("argument --content: LOW < HIGH must be %s" % HEIGHT_RANGE)
+
+    return args.content
+
+def add_resample(parser):
+
+    """ time axis of the written ED's """
+
+    parser.add_argument("--resample", type=resample_step, default=None,
+            metavar="ix|SECONDS", help="Write ED's on the flux time stamps (ix) or "
+            "on a uniform grid of SECONDS instead of the delayed times")
+
+def add_fit(parser):
+
+    """ backend of the model fit """
+
+    parser.add_argument("--fit", default=Flared.fit_backend, choices=sorted(BACKENDS),
+            help="Backend fitting the beta and h' curves to the flares")
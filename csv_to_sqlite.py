@@ -5,10 +5,22 @@ from sqlite3 import Error
 from sqlite_utils import *
 import csv
 import datetime
+import argparse
 
-def main():
+PARSER = argparse.ArgumentParser(description="",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+PARSER.add_argument("csv", nargs="*", default=["data/flare_vlf.csv"],
+        help="Csv files with flares, inserted or updated by (transmiter, date, time)")
+PARSER.add_argument("--db", default="data/flare_vlf.db",
+        help="Database file")
+
+# averaged beta and reflection height of all flares with the same ix
+SQL_SELECT_AVERAGES = """SELECT ix, AVG(beta), AVG(reflection_height), COUNT(*)
+        FROM flares"""
+
+def main(args):
 
-    table_name = "flares"
     sql_create_flares_table = """CREATE TABLE IF NOT EXISTS flares (
                                     transmiter text,
                                     date text NOT NULL, -- 01 Jan 1971
@@ -22,22 +34,84 @@ def main():
                                     ed_control_value real NOT NULL -- for height 74
                                     ); """
 
-    sql_insert_into_flares = """INSERT INTO flares \
-            VALUES(?,?,?,?,?,?,?,?,?,?); """
+    # natural key of a flare and the ix index used by the sorted queries
+    sql_create_key_index = """CREATE UNIQUE INDEX IF NOT EXISTS flares_key
+            ON flares (transmiter, date, time_ut); """
+    sql_create_ix_index = """CREATE INDEX IF NOT EXISTS flares_ix
+            ON flares (ix); """
+
+    # per ix averages, kept up to date by the triggers below
+    sql_create_averages_table = """CREATE TABLE IF NOT EXISTS flares_averages (
+                                    ix real PRIMARY KEY, -- W/m2
+                                    beta real NOT NULL,
+                                    reflection_height real NOT NULL,
+                                    n integer NOT NULL -- number of flares
+                                    ); """
+
+    sql_create_triggers = [
+        """CREATE TRIGGER IF NOT EXISTS flares_averages_insert
+            AFTER INSERT ON flares BEGIN
+                INSERT OR REPLACE INTO flares_averages
+                    %s WHERE ix = NEW.ix GROUP BY ix;
+            END; """ % SQL_SELECT_AVERAGES,
+        """CREATE TRIGGER IF NOT EXISTS flares_averages_update
+            AFTER UPDATE ON flares BEGIN
+                DELETE FROM flares_averages WHERE ix IN (OLD.ix, NEW.ix);
+                INSERT INTO flares_averages
+                    %s WHERE ix IN (OLD.ix, NEW.ix) GROUP BY ix;
+            END; """ % SQL_SELECT_AVERAGES,
+        """CREATE TRIGGER IF NOT EXISTS flares_averages_delete
+            AFTER DELETE ON flares BEGIN
+                DELETE FROM flares_averages WHERE ix = OLD.ix;
+                INSERT INTO flares_averages
+                    %s WHERE ix = OLD.ix GROUP BY ix;
+            END; """ % SQL_SELECT_AVERAGES]
+
+    sql_rebuild_averages = """INSERT INTO flares_averages
+            %s GROUP BY ix; """ % SQL_SELECT_AVERAGES
+
+    # rows with unchanged values are left alone, so re-running the
+    # ingestion of the same csv doesn't touch the averages
+    columns = ["class", "ix", "delta_amp", "delta_phase", "beta",
+            "reflection_height", "ed_control_value"]
+    sql_upsert_into_flares = """INSERT INTO flares \
+            VALUES(?,?,?,?,?,?,?,?,?,?) \
+            ON CONFLICT(transmiter, date, time_ut) DO UPDATE SET %s \
+            WHERE %s; """ % (
+                    ", ".join("%s=excluded.%s" % (c, c) for c in columns),
+                    " OR ".join("%s IS NOT excluded.%s" % (c, c) for c in columns))
+
+    conn = create_connection(args.db)
+    if conn is None:
+        return
+
+    # WAL lets running jobs keep reading the db during ingestion
+    set_journal_mode(conn, "WAL")
+
+    create_table(conn, sql_create_flares_table)
+    create_table(conn, sql_create_key_index)
+    create_table(conn, sql_create_ix_index)
+    create_table(conn, sql_create_averages_table)
+    for sql in sql_create_triggers:
+        create_table(conn, sql)
 
-    database = r"data/flare_vlf.db"
-    conn = create_connection(database)
+    # averages of a db created before the averages table
+    if not custom_query(conn, "SELECT 1 FROM flares_averages LIMIT 1;"):
+        populate_table(conn, sql_rebuild_averages, [()])
 
-    if conn is not None:
-        create_table(conn, sql_create_flares_table)
-        truncate_table(conn, table_name)
+    for filename in args.csv:
+        with open(filename) as a_file:
+            rows = csv.reader(a_file)
+            header = next(rows, None)
 
-    a_file = open("data/flare_vlf.csv")
-    rows = csv.reader(a_file)
-    header = next(rows, None)
+            # all rows of a file are inserted in a single transaction
+            with conn:
+                populate_table(conn, sql_upsert_into_flares, rows)
 
-    with conn:
-        populate_table(conn, sql_insert_into_flares, rows)
+    # back to a single self-contained db file, which is also what the
+    # model cache key of Flared is computed from
+    set_journal_mode(conn, "DELETE")
+    conn.close()
 
 if __name__ == '__main__':
-    main()
+    main(PARSER.parse_args())
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+
+""" Downsampling of long series for plotting. Both methods return sorted
+indices of the samples to keep, including the first and the last one, so
+several series sharing an axis can be decimated alike """
+
+import numpy as np
+
+def minmax_indices(y, points):
+
+    """ indices of the minimum and maximum of y in each of points/2
+    equally long buckets, peaks and dips are always kept """
+
+    n = len(y)
+    buckets = points//2
+    if buckets < 1 or 2*buckets + 2 >= n:
+        return np.arange(n)
+
+    size = -(-n//buckets)
+    buckets = -(-n//size)
+    # the last bucket is padded with its own last sample
+    blocks = np.pad(np.asarray(y, dtype=float), (0, buckets*size - n),
+            mode='edge').reshape(buckets, size)
+    starts = np.arange(buckets)*size
+
+    return np.unique(np.concatenate(([0, n - 1],
+        np.minimum(starts + blocks.argmin(axis=1), n - 1),
+        np.minimum(starts + blocks.argmax(axis=1), n - 1))))
+
+def lttb_indices(x, y, points):
+
+    """ largest triangle three buckets: one sample per bucket, the one
+    spanning the largest triangle with the sample kept in the previous
+    bucket and the mean of the next bucket """
+
+    n = len(y)
+    if points < 3 or points >= n:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+
+    # points-2 buckets between the first and the last sample
+    edges = np.linspace(1, n - 1, points - 1).astype(int)
+    counts = np.diff(edges)
+    mean_x = np.add.reduceat(x[:-1], edges[:-1])/counts
+    mean_y = np.add.reduceat(y[:-1], edges[:-1])/counts
+    mean_x = np.append(mean_x[1:], x[-1])
+    mean_y = np.append(mean_y[1:], y[-1])
+
+    kept = np.empty(points, dtype=int)
+    kept[0], kept[-1] = 0, n - 1
+    a = 0
+    for i in range(points - 2):
+        lo, hi = edges[i], edges[i + 1]
+        area = np.abs((x[a] - mean_x[i])*(y[lo:hi] - y[a])
+                - (x[a] - x[lo:hi])*(mean_y[i] - y[a]))
+        a = lo + int(area.argmax())
+        kept[i + 1] = a
+
+    return kept
+
+# method name: function of (x, y, points) returning the indices to keep
+METHODS = {'lttb': lttb_indices,
+        'minmax': lambda x, y, points: minmax_indices(y, points)}
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+
+""" Fit backends of the beta and h' curves. A backend takes the averaged
+calibration points (ix, beta, h') and the fit settings, and returns knots of
+both curves which are interpolated linearly, so the model cache, lookup
+tables and evaluation are the same whatever the backend:
+    polyfit     poly_deg monomials in ix, with a tail_deg tail (the original)
+    chebyshev   Chebyshev series of degree cheb_deg in log10(ix)
+    spline      cubic smoothing spline in log10(ix), smoothing by GCV
+    pchip       monotone piecewise cubic interpolation in log10(ix)
+The log10(ix) backends are sampled at `knots` points uniform in log10(ix)
+together with the calibration points themselves. Each backend raises
+ValueError when there are fewer points than it needs """
+
+import warnings
+import numpy as np
+
+def _check_points(x, needed):
+
+    """ raises ValueError unless there are at least needed points """
+
+    if len(x) < needed:
+        raise ValueError("%d distinct ix values to fit, at least %d are needed"
+                % (len(x), needed))
+
+def polyfit(x, y, y2, settings):
+
+    """ most of the curve as a poly_deg polynomial in ix, up to x[poly_end],
+    then a tail_deg polynomial from x[tail_start], fitted to all points """
+
+    _check_points(x, -settings['poly_end'])
+    xpoly1 = np.linspace(x[0], x[settings['poly_end']],
+            num=settings['num'], endpoint=True)
+    xpoly2 = np.linspace(x[settings['tail_start']], x[-1],
+            num=settings['num'], endpoint=True)
+
+    # the monomials of ix's of 1e-6 are badly conditioned at high degrees,
+    # polyfit truncates the smallest singular values and warns about it
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', np.exceptions.RankWarning)
+
+        poly_deg = settings['poly_deg']
+        ypoly1 = np.polyval(np.polyfit(x, y, poly_deg), xpoly1)
+        y2poly1 = np.polyval(np.polyfit(x, y2, poly_deg), xpoly1)
+
+        poly_deg = settings['tail_deg']
+        ypoly2 = np.polyval(np.polyfit(x, y, poly_deg), xpoly2)
+        y2poly2 = np.polyval(np.polyfit(x, y2, poly_deg), xpoly2)
+
+    # glue the dots again
+    return np.concatenate((xpoly1, xpoly2)), np.concatenate((ypoly1, ypoly2)), \
+            np.concatenate((y2poly1, y2poly2))
+
+def _log_knots(x, settings):
+
+    """ knots uniform in log10(ix) over the range of x, merged with x """
+
+    x = np.asarray(x, dtype=float)
+    knots = np.union1d(np.logspace(np.log10(x[0]), np.log10(x[-1]),
+        settings['knots']), x)
+
+    return knots[(knots >= x[0]) & (knots <= x[-1])]
+
+def _log_backend(fit):
+
+    """ backend sampling fit(u, values), a callable of u = log10(ix)
+    fitted to the calibration points, at the log knots """
+
+    def backend(x, y, y2, settings):
+        u = np.log10(np.asarray(x, dtype=float))
+        f_y = fit(u, np.asarray(y, dtype=float), settings)
+        f_y2 = fit(u, np.asarray(y2, dtype=float), settings)
+        knots = _log_knots(x, settings)
+        return knots, f_y(np.log10(knots)), f_y2(np.log10(knots))
+
+    backend.__doc__ = fit.__doc__
+    return backend
+
+def _chebyshev(u, values, settings):
+
+    """ least squares Chebyshev series of degree cheb_deg in log10(ix),
+    well conditioned as log10(ix) is mapped onto [-1, 1] """
+
+    _check_points(u, settings['cheb_deg'] + 1)
+    return np.polynomial.Chebyshev.fit(u, values, settings['cheb_deg'])
+
+def _spline(u, values, settings):
+
+    """ cubic smoothing spline in log10(ix), the smoothing is chosen by
+    generalized cross-validation """
+
+    _check_points(u, 5)
+    from scipy.interpolate import make_smoothing_spline
+    return make_smoothing_spline(u, values)
+
+def _pchip(u, values, settings):
+
+    """ monotone piecewise cubic interpolation of the points in log10(ix),
+    passes through every point without overshooting between them """
+
+    _check_points(u, 2)
+    from scipy.interpolate import PchipInterpolator
+    return PchipInterpolator(u, values)
+
+BACKENDS = {'polyfit': polyfit,
+        'chebyshev': _log_backend(_chebyshev),
+        'spline': _log_backend(_spline),
+        'pchip': _log_backend(_pchip)}
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+
+""" Single pass segmentation of a solar X-ray flux series into flare events """
+
+from collections import namedtuple
+import numpy as np
+
+# indices are positions in the whole series, end is None while the
+# event is still decaying at the end of the data
+FlareEvent = namedtuple('FlareEvent', 'onset peak end ix_onset ix_peak')
+
+class EventDetector:
+
+    """ detects flare events sample by sample, similar to the NOAA rule:
+    an event starts with `rise` consecutive increases of the flux which end at
+    least `ratio` times above the onset flux, peaks at the maximum flux and ends
+    when the flux decays to the half way between the onset and the peak flux.
+    Data can be fed in chunks, the state is kept between the calls """
+
+    def __init__(self, rise=4, ratio=1.4):
+
+        self.rise = rise
+        self.ratio = ratio
+        self.events = []
+
+        self._n = 0
+        self._prev = None
+        self._run = 0
+        self._run_start = (0, None)
+        self._open = None
+
+    def update(self, ixs):
+
+        """ feeds the next chunk of flux values, returns events
+        which were closed within the chunk """
+
+        closed = []
+        n = self._n
+        prev = self._prev
+        run = self._run
+        run_start = self._run_start
+        event = self._open
+
+        for i, ix in enumerate(np.asarray(ixs, dtype=float).tolist(), n):
+            if event is None:
+                if prev is not None and ix > prev:
+                    run += 1
+                else:
+                    run = 0
+                    run_start = (i, ix)
+                if run >= self.rise and ix >= self.ratio*run_start[1]:
+                    event = [run_start[0], i, None, run_start[1], ix]
+            elif ix > event[4]:
+                event[1] = i
+                event[4] = ix
+            elif ix <= (event[3] + event[4])/2:
+                event[2] = i
+                closed.append(FlareEvent(*event))
+                event = None
+                run = 0
+                run_start = (i, ix)
+            prev = ix
+
+        self._n = n + len(ixs)
+        self._prev = prev
+        self._run = run
+        self._run_start = run_start
+        self._open = event
+        self.events.extend(closed)
+
+        return closed
+
+    def all_events(self):
+
+        """ closed events along with the event still in progress """
+
+        if self._open is None:
+            return list(self.events)
+        return self.events + [FlareEvent(*self._open)]
+
+def segment_indices(events, start, n):
+
+    """ assigns each of n samples, starting at index start, to an event.
+    The series is split at event onsets, so each event owns the samples
+    from its onset to the next onset and the first event also owns the
+    samples before it. Returns event index per sample """
+
+    onsets = np.array([e.onset for e in events[1:]], dtype=np.int64)
+    return np.searchsorted(onsets, np.arange(start, start + n), side='right')
+
+def detect_events(ixs, rise=4, ratio=1.4):
+
+    """ returns list of flare events found in a whole flux series """
+
+    detector = EventDetector(rise, ratio)
+    detector.update(ixs)
+    return detector.all_events()
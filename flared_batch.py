@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+
+""" Time series calculation for a directory (or glob) of flux files.
+The model is fitted once and the files are spread across a process
+pool, each file gets its own results folder named after it """
+
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from Flared import Flared, Flared_t
+import cli_options
+from decimate import METHODS as DECIMATION
+
+PARSER = argparse.ArgumentParser(description="",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+PARSER.add_argument("inputs", nargs="+",
+        help="Directories (all *.csv inside) or glob patterns of flux files")
+cli_options.add_heights(PARSER)
+PARSER.add_argument("--workers", type=int, default=os.cpu_count(),
+        help="Processes working on the files")
+PARSER.add_argument("--output", default="results",
+        help="Folder for the per file results folders and the summary")
+PARSER.add_argument("--events", action="store_true",
+        help="Split each series into flare events, each with its own time delay")
+cli_options.add_fit(PARSER)
+cli_options.add_lookup(PARSER)
+cli_options.add_resample(PARSER)
+cli_options.add_content(PARSER)
+cli_options.add_out_of_range(PARSER)
+cli_options.add_format(PARSER)
+PARSER.add_argument("--plot-points", type=int, default=Flared_t.plot_points,
+        help="Samples shown in the figure at most, 0 for all")
+PARSER.add_argument("--decimation", default=Flared_t.plot_decimation,
+        choices=sorted(DECIMATION), help="How samples shown in the figure are picked")
+PARSER.add_argument("--no-plot", action="store_true",
+        help="Write the data tables only, skip the figures")
+
+def find_inputs(inputs):
+
+    """ expands directories and glob patterns to a sorted list of files """
+
+    paths = set()
+    for pattern in inputs:
+        if os.path.isdir(pattern):
+            pattern = os.path.join(pattern, "*.csv")
+        paths.update(p for p in glob.glob(pattern) if os.path.isfile(p))
+
+    return sorted(paths)
+
+def result_names(paths):
+
+    """ results folder names from file names, files with the same name in
+    different directories get as many parent directories as needed """
+
+    parts = [os.path.splitext(os.path.abspath(p))[0].strip(os.sep).split(os.sep)
+            for p in paths]
+    depth = 1
+    while depth < max(len(p) for p in parts):
+        names = ["_".join(p[-depth:]) for p in parts]
+        if len(set(names)) == len(names):
+            break
+        depth += 1
+    else:
+        names = ["_".join(p) for p in parts]
+
+    return ["Flared_t-%s" % name for name in names]
+
+def _init_worker(lookup, plot_points, decimation, out_of_range, content_heights,
+        resample, fit_backend):
+
+    """ loads the model once per worker process, forked workers already
+    have it from the parent, and sets up the figures. Every worker renders
+    the figures of its own files, so figures are rendered in parallel """
+
+    Flared.fit_backend = fit_backend
+    Flared(lookup)
+    Flared_t.plot_points = plot_points
+    Flared_t.plot_decimation = decimation
+    Flared.out_of_range = out_of_range
+    Flared.content_heights = content_heights
+    Flared_t.resample = resample
+
+def process_file(path, folder, heights, segment, lookup, plot, output_format):
+
+    """ calculates and writes results for one flux file, returns number
+    of samples, seconds spent and numbers of ix's below and above the
+    fitted range """
+
+    start = time.perf_counter()
+    f = Flared_t(heights, time_series=path, segment=segment, lookup=lookup,
+            folder=folder)
+    f.write_and_plot(plot=plot, output_format=output_format)
+
+    counters = f.profile.counters
+    return len(f.ix_list), time.perf_counter() - start, \
+            counters.get('ix_below_range', 0), counters.get('ix_above_range', 0)
+
+def main(args):
+
+    heights = cli_options.expand_heights(PARSER, args)
+
+    cli_options.check_content(PARSER, args)
+
+    paths = find_inputs(args.inputs)
+    if not paths:
+        PARSER.error("no input files found")
+
+    # fit (or load) the model before the workers are started
+    Flared.fit_backend = args.fit
+    Flared(args.lookup)
+
+    start = time.perf_counter()
+    files = []
+    with ProcessPoolExecutor(args.workers, initializer=_init_worker,
+            initargs=(args.lookup, args.plot_points, args.decimation,
+                args.out_of_range, args.content, args.resample, args.fit)) as pool:
+        futures = {pool.submit(process_file, path,
+            os.path.join(args.output, name), heights, args.events,
+            args.lookup, not args.no_plot, args.format): (path, name)
+            for path, name in zip(paths, result_names(paths))}
+
+        for future in as_completed(futures):
+            path, name = futures[future]
+            try:
+                samples, seconds, below, above = future.result()
+                files.append({'input': path, 'folder': name, 'samples': samples,
+                    'seconds': seconds, 'ix_below_range': below,
+                    'ix_above_range': above})
+            except Exception as e:
+                files.append({'input': path, 'folder': name,
+                    'error': "%s: %s" % (e.__class__.__name__, e)})
+                print("failed %s: %s" % (path, e), file=sys.stderr)
+
+    elapsed = time.perf_counter() - start
+    done = [f for f in files if 'error' not in f]
+    samples = sum(f['samples'] for f in done)
+    summary = {'files': len(files),
+            'succeeded': len(done),
+            'failed': len(files) - len(done),
+            'samples': samples,
+            'ix_below_range': sum(f['ix_below_range'] for f in done),
+            'ix_above_range': sum(f['ix_above_range'] for f in done),
+            'seconds': elapsed,
+            'files_per_second': len(files)/elapsed,
+            'samples_per_second': samples/elapsed,
+            'results': sorted(files, key=lambda f: f['input'])}
+
+    os.makedirs(args.output, exist_ok=True)
+    with open(os.path.join(args.output, "batch_summary.json"), 'w') as out:
+        json.dump(summary, out, indent=2)
+
+    print("%d files, %d failed, %d samples in %.2f s (%.1f files/s, %.0f samples/s)"
+            % (summary['files'], summary['failed'], samples, elapsed,
+                summary['files_per_second'], summary['samples_per_second']))
+
+    return 1 if summary['failed'] else 0
+
+if __name__ == "__main__":
+    sys.exit(main(PARSER.parse_args()))
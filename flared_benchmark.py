@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+
+""" Benchmark of flarED stages, from the db query to the figure output,
+on synthetic flux series. Results are written as json, so runs can be
+compared across commits """
+
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime
+import numpy as np
+from Flared import Flared, Flared_t
+from output_writers import WRITERS
+import flux_cache
+from fit_backends import BACKENDS
+
+PARSER = argparse.ArgumentParser(description="",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+PARSER.add_argument("--samples", type=int, nargs="+",
+        default=[10**3, 10**4, 10**5, 10**6, 10**7],
+        help="Lengths of synthetic flux series")
+PARSER.add_argument("--heights", type=int, nargs="+", default=[1, 41, 400],
+        help="Numbers of height levels between 50 and 90 km")
+PARSER.add_argument("--repeat", type=int, default=3,
+        help="Timed runs of each stage, min and median are reported")
+PARSER.add_argument("--max-elements", type=float, default=5e7,
+        help="Skip ED matrices (samples x heights) larger than this")
+PARSER.add_argument("--max-write-elements", type=float, default=5e6,
+        help="Skip writing of larger data tables (samples x heights)")
+PARSER.add_argument("--max-plot-elements", type=float, default=5e6,
+        help="Skip plotting of larger outputs (samples x heights)")
+PARSER.add_argument("--formats", nargs="+", default=["csv", "npz"],
+        choices=sorted(WRITERS), help="Data table formats to time")
+PARSER.add_argument("--backends", nargs="+", default=sorted(BACKENDS),
+        choices=sorted(BACKENDS), help="Fit backends to compare")
+PARSER.add_argument("--eval-samples", type=int, default=10**6,
+        help="Samples evaluated per fit backend")
+PARSER.add_argument("--fits-only", action="store_true",
+        help="Only compare the fit backends, skip the synthetic series")
+PARSER.add_argument("--seed", type=int, default=0,
+        help="Seed of the synthetic flux series")
+PARSER.add_argument("-o", "--output", default="bench_output.json",
+        help="Json file with the results")
+
+def synthetic_flux(n, seed):
+
+    """ background flux with randomly placed flares of log-uniform peaks,
+    kept inside the fitted ix range """
+
+    rng = np.random.default_rng(seed)
+    ix = np.full(n, 1.0e-6)
+    for start in rng.integers(0, n, max(1, n//500)).tolist():
+        peak = 10**rng.uniform(-6, -3.7)
+        rise, decay = rng.integers(3, 30), rng.integers(10, 120)
+        t = np.arange(max(0, start - 10*rise), min(n, start + 10*decay))
+        ix[t] += peak*np.where(t >= start, np.exp(-(t - start)/decay),
+                np.exp((t - start)/rise))
+    ix *= rng.lognormal(0, 0.02, n)
+
+    return np.clip(ix, 8.0e-07, 2.2e-04)
+
+def write_time_series(path, ix):
+
+    """ writes flux in the time_series.csv format """
+
+    minutes = np.arange(len(ix))
+    with open(path, 'w') as f:
+        f.write("time,Ix\n")
+        for m, i in zip(minutes.tolist(), ix.tolist()):
+            f.write("%d:%02d,%r\n" % ((m//60) % 24, m % 60, i))
+
+def timeit(func, repeat):
+
+    """ runs func repeat times, returns timings in seconds """
+
+    runs = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        func()
+        runs.append(time.perf_counter() - start)
+
+    return {'min': min(runs), 'median': float(np.median(runs)), 'runs': runs}
+
+def git_commit():
+
+    """ current commit of the working tree, if any """
+
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True,
+                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def record(results, stage, timing, **params):
+
+    """ appends a stage timing to results and prints a short line """
+
+    results.append(dict(stage=stage, **params, **timing))
+    print("%-28s %-52s %.6f s" % (stage, params, timing['min']))
+
+def benchmark_fits(args, results):
+
+    """ fit time, evaluation throughput and residuals at the averaged
+    calibration points of every fit backend """
+
+    ix = synthetic_flux(args.eval_samples, args.seed)
+    for backend in args.backends:
+        Flared.fit_backend = backend
+        f = Flared()
+        x, y, y2 = (np.array(values) for values in (f.ix_vlf_reduced,
+            f.beta_vlf_reduced, f.hprim_vlf_reduced))
+
+        record(results, 'fit', timeit(lambda: BACKENDS[backend](x, y, y2,
+            f.fit_settings), args.repeat), backend=backend)
+        timing = timeit(lambda: f.calculate_ed(ix, [74]), args.repeat)
+        record(results, 'evaluate', timing, backend=backend, samples=len(ix))
+
+        beta_residuals = f.f_beta(x) - y
+        hprim_residuals = f.f_hprim(x) - y2
+        results.append({'stage': 'residuals', 'backend': backend,
+            'knots': len(f.f_beta.x),
+            'samples_per_second': len(ix)/timing['min'],
+            'beta_rms': float(np.sqrt(np.mean(beta_residuals**2))),
+            'beta_max': float(np.abs(beta_residuals).max()),
+            'hprim_rms': float(np.sqrt(np.mean(hprim_residuals**2))),
+            'hprim_max': float(np.abs(hprim_residuals).max())})
+        print("%-28s %-52s beta rms %.4f, h' rms %.3f" % ('residuals',
+            {'backend': backend}, results[-1]['beta_rms'], results[-1]['hprim_rms']))
+
+    Flared.fit_backend = 'polyfit'
+
+def main(args):
+
+    results = []
+    benchmark_fits(args, results)
+    if args.fits_only:
+        args.samples = []
+
+    f = Flared()
+
+    # db and fit stages don't depend on the synthetic input
+    record(results, '_query_db', timeit(f._query_db, args.repeat))
+    query = f.query
+    record(results, '_get_list_of_averages',
+            timeit(lambda: f._get_list_of_averages(query), args.repeat))
+    record(results, '_polyfit', timeit(lambda: f._polyfit(query), args.repeat))
+
+    with tempfile.TemporaryDirectory() as folder:
+        for n in args.samples:
+            path = os.path.join(folder, "time_series_%d.csv" % n)
+            ix = synthetic_flux(n, args.seed)
+            write_time_series(path, ix)
+
+            for m in args.heights:
+                if n*m > args.max_elements:
+                    results.append({'stage': 'skipped', 'samples': n, 'heights': m})
+                    continue
+
+                heights = np.linspace(50, 90, m) if m > 1 else [74]
+                t = Flared_t(heights, time_series=path, stream=True)
+                t.folder = os.path.join(folder, "results_%d_%d" % (n, m))
+
+                # cold runs parse the csv every time, warm ones memory-map
+                # the .flux sidecar written by the first of them
+                t.flux_sidecar = False
+                record(results, 'Flared_t._calculate_flared',
+                        timeit(t._calculate_flared, args.repeat), samples=n, heights=m,
+                        flux='cold')
+                t.flux_sidecar = True
+                t._calculate_flared()
+                record(results, 'Flared_t._calculate_flared',
+                        timeit(t._calculate_flared, args.repeat), samples=n, heights=m,
+                        flux='warm')
+                record(results, 'calculate_easyfit',
+                        timeit(lambda: t.calculate_easyfit(ix, t.heights), args.repeat),
+                        samples=n, heights=m)
+
+                if n*m > args.max_write_elements and n*m > args.max_plot_elements:
+                    continue
+
+                # full calculation, needed by the writing and plotting stages
+                t = Flared_t(heights, time_series=path)
+                t.folder = os.path.join(folder, "results_%d_%d" % (n, m))
+
+                if n*m <= args.max_write_elements:
+                    for output_format in args.formats:
+                        record(results, 'write_table',
+                                timeit(lambda: t.write_table(t.results(), output_format),
+                                    args.repeat), samples=n, heights=m,
+                                format=output_format)
+                if n*m <= args.max_plot_elements:
+                    record(results, 'plot', timeit(t.plot, args.repeat),
+                            samples=n, heights=m)
+
+            os.remove(path)
+            if os.path.exists(flux_cache.sidecar_path(path)):
+                os.remove(flux_cache.sidecar_path(path))
+
+    report = {'date': datetime.now().isoformat(timespec='seconds'),
+            'commit': git_commit(),
+            'python': sys.version.split()[0],
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'seed': args.seed,
+            'repeat': args.repeat,
+            'results': results}
+
+    with open(args.output, 'w') as out:
+        json.dump(report, out, indent=2)
+
+if __name__ == "__main__":
+    main(PARSER.parse_args())
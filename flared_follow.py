@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+
+""" Follow mode for a flux file which is appended to in real time. The
+model is loaded once, new samples are calculated as they arrive and
+appended to the data table. The peak flux (of the current event with
+--events) and so the time delay are updated with every new sample, each
+sample is delayed by the peak known when it arrived. The latest samples
+are kept in a ring buffer, from which the figure is redrawn periodically """
+
+import sys
+import csv
+import time
+import argparse
+import numpy as np
+from Flared import Flared, Flared_t, parse_times, delay_times
+from flare_events import EventDetector
+from output_writers import WRITERS
+import cli_options
+
+PARSER = argparse.ArgumentParser(description="",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+PARSER.add_argument("time_series", nargs="?", default=Flared_t.time_series,
+        help="Flux file to follow, formatted as data/time_series.csv")
+cli_options.add_heights(PARSER)
+PARSER.add_argument("--events", action="store_true",
+        help="Split the series into flare events, each with its own time delay")
+cli_options.add_lookup(PARSER)
+cli_options.add_resample(PARSER)
+cli_options.add_content(PARSER)
+cli_options.add_out_of_range(PARSER)
+cli_options.add_format(PARSER,
+        choices=[name for name, writer in WRITERS.items() if writer.text],
+        help="Format of the data table, appended to as samples arrive")
+PARSER.add_argument("--poll", type=float, default=0.01,
+        help="Seconds between checks for new samples")
+PARSER.add_argument("--buffer", type=int, default=10000,
+        help="Latest samples kept for the figure")
+PARSER.add_argument("--plot-every", type=float, default=0,
+        metavar="SECONDS", help="Redraw the figure of the buffered samples this "
+        "often, 0 for no figure")
+PARSER.add_argument("--idle-exit", type=float, default=None,
+        metavar="SECONDS", help="Stop after this long without new samples")
+
+class RingBuffer:
+
+    """ the latest size rows of named columns, kept in arrays
+    allocated on the first extend, rows may be arrays themselves """
+
+    def __init__(self, size):
+
+        self.size = size
+        self.columns = None
+        self.count = 0
+
+    def __len__(self):
+
+        return min(self.count, self.size)
+
+    def extend(self, columns):
+
+        """ appends rows, overwriting the oldest ones """
+
+        if self.columns is None:
+            self.columns = {key: np.empty((self.size,) + np.shape(values)[1:],
+                dtype=np.asarray(values).dtype) for key, values in columns.items()}
+
+        n = len(next(iter(columns.values())))
+        skip = max(0, n - self.size)
+        positions = (self.count + np.arange(skip, n)) % self.size
+        for key, values in columns.items():
+            self.columns[key][positions] = np.asarray(values)[skip:]
+        self.count += n
+
+    def snapshot(self):
+
+        """ copies of the buffered columns, oldest row first """
+
+        if self.columns is None:
+            return {}
+        order = (self.count - len(self) + np.arange(len(self))) % self.size
+
+        return {key: values[order] for key, values in self.columns.items()}
+
+class FluxFollower:
+
+    """ calculates a flux series sample block by sample block with the
+    model and settings of a Flared_t, keeping the event detection and the
+    peak flux between the blocks """
+
+    def __init__(self, flared, buffer_size=10000):
+
+        self.flared = flared
+        self.buffer = RingBuffer(buffer_size)
+        self.detector = EventDetector()
+        self.ix_max = 0.0
+        self.last = None
+        self.samples = 0
+
+    def update(self, stamps, ixs):
+
+        """ calculates new samples from their time stamps and ix's,
+        returns their output columns """
+
+        f = self.flared
+        times = parse_times(stamps, self.last)
+        ix = f._parse_flux(ixs)
+        if f._dated is None:
+            f._dated = '-' in stamps[0]
+
+        self.ix_max = np.max(ix, initial=self.ix_max, where=~np.isnan(ix))
+        if f.segment:
+            self.detector.update(ix)
+            # new samples can only belong to the latest closed event
+            # or the one in progress
+            del self.detector.events[:-1]
+            f.events = self.detector.all_events()
+        delays = f._delays(self.samples, len(ix), self.ix_max)
+
+        ed, beta, hprim = f.calculate_ed(ix, f.heights)
+        ed_easy = f._calculate_easyfit_cube(ix)
+        delayed = delay_times(times, delays)
+
+        self.buffer.extend({'time': times, 'ix': ix, 'time_ed': delayed,
+            'ed': ed, 'ed_easy': ed_easy, 'beta': beta, 'hprim': hprim})
+        self.last = times[-1]
+        self.samples += len(ix)
+
+        return f._columns(times, ix, delayed, ed, ed_easy, beta, hprim)
+
+    def plot(self):
+
+        """ draws the figure of the buffered samples """
+
+        f = self.flared
+        latest = self.buffer.snapshot()
+        if not latest:
+            return
+        f.timestamp_list, f.ix_list, f.timestamp_delta_list = \
+                latest['time'], latest['ix'], latest['time_ed']
+        f.ed_cube, f.ed_easy_cube = latest['ed'], latest['ed_easy']
+        f.ed_list, f.ed_easy_list = f.ed_cube[:, 0], f.ed_easy_cube[:, 0]
+        f.beta_list, f.hprim_list = latest['beta'], latest['hprim']
+        f.plot()
+
+def tail(path, poll, idle_exit=None, block_size=1 << 20):
+
+    """ yields lists of csv rows as they are appended to path, starting
+    from its beginning, the header row is skipped. The file is read in blocks
+    of block_size bytes, so a long backlog is not loaded at once. Rows are
+    only read once their line is complete. Returns after idle_exit seconds
+    without rows """
+
+    partial = b''
+    header = None
+    idle = time.monotonic()
+    with open(path, 'rb') as a_file:
+        while True:
+            data = a_file.read(block_size)
+            if not data:
+                if idle_exit is not None and time.monotonic() - idle > idle_exit:
+                    return
+                time.sleep(poll)
+                continue
+
+            lines = (partial + data).split(b'\n')
+            partial = lines.pop()
+            rows = [row for row in csv.reader(line.decode() for line in lines) if row]
+            if header is None and rows:
+                header = rows.pop(0)
+            if rows:
+                idle = time.monotonic()
+                yield rows
+
+def main(args):
+
+    heights = cli_options.expand_heights(PARSER, args)
+
+    cli_options.check_content(PARSER, args)
+
+    Flared.out_of_range = args.out_of_range
+    Flared.content_heights = args.content
+    f = Flared_t(heights, time_series=args.time_series, stream=True,
+            segment=args.events, lookup=args.lookup)
+    follower = FluxFollower(f, args.buffer)
+    f.resample = args.resample
+    resampler = f.resampler() if f.resample is not None else None
+
+    writer_class = WRITERS[args.format]
+    f._make_folder()
+    print("following %s, results in %s" % (args.time_series, f.folder))
+
+    seconds = 0.0
+    plotted = time.monotonic()
+    with writer_class("%s/data_table.%s" % (f.folder, writer_class.extension)) as writer:
+        try:
+            for rows in tail(args.time_series, args.poll, args.idle_exit):
+                start = time.perf_counter()
+                columns = follower.update([row[0] for row in rows],
+                        [row[1] if len(row) > 1 else '' for row in rows])
+                # resampled rows are written once the delayed ED's reach them
+                if resampler is not None:
+                    columns = resampler.feed(columns)
+                writer.write(f._format_chunk(columns))
+                writer.flush()
+                seconds += time.perf_counter() - start
+
+                if args.plot_every and time.monotonic() - plotted >= args.plot_every:
+                    follower.plot()
+                    plotted = time.monotonic()
+        except KeyboardInterrupt:
+            pass
+        if resampler is not None:
+            writer.write(f._format_chunk(resampler.flush()))
+
+    if args.plot_every:
+        follower.plot()
+    if follower.samples:
+        print("%d samples, %.3f ms per sample" % (follower.samples,
+            1000*seconds/follower.samples))
+    if f.out_of_range_note():
+        print(f.out_of_range_note(), file=sys.stderr)
+
+if __name__ == "__main__":
+    main(PARSER.parse_args())
@@ -4,14 +4,43 @@ import sys
 import argparse
 from Flared import *
 from Range import Range
+import cli_options
 
 PARSER = argparse.ArgumentParser(description="",
         formatter_class=argparse.ArgumentDefaultsHelpFormatter)
 
 PARSER.add_argument("-ix", "--ix", type=float, default=None, required=True,
         choices=[Range(8.0e-07, 0.00022)], help="Solar X-Ray Flux")
+cli_options.add_fit(PARSER)
+cli_options.add_lookup(PARSER)
+PARSER.add_argument("--show", action="store_true",
+        help="Show the figure in an interactive window")
+cli_options.add_format(PARSER)
+PARSER.add_argument("--no-plot", action="store_true",
+        help="Write the data table only, skip the figure")
+cli_options.add_content(PARSER)
+cli_options.add_out_of_range(PARSER)
+cli_options.add_subset(PARSER)
+cli_options.add_bootstrap(PARSER)
+cli_options.add_profile(PARSER)
 ARGS = PARSER.parse_args()
+cli_options.check_bootstrap(PARSER, ARGS)
+Flared.confidence = ARGS.confidence
+Flared.out_of_range = ARGS.out_of_range
+Flared.fit_backend = ARGS.fit
+Flared.content_heights = cli_options.check_content(PARSER, ARGS)
+SUBSET = cli_options.subset(ARGS)
 
 if __name__ == "__main__":
-    f = Flared_h(ARGS.ix)
-    f.write_and_plot()
+    try:
+        f = Flared_h(ARGS.ix, lookup=ARGS.lookup, subset=SUBSET,
+                bootstrap=ARGS.bootstrap)
+    except ValueError as e:
+        PARSER.error(e)
+    f.write_and_plot(plot=not ARGS.no_plot, show=ARGS.show,
+                output_format=ARGS.format)
+
+    if f.out_of_range_note():
+        print(f.out_of_range_note(), file=sys.stderr)
+
+    cli_options.write_profile(ARGS, f.profile)
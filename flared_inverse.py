@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+
+""" Inverse calculation: the solar X-ray flux explaining a series of
+electron densities measured at a given altitude, along with the implied
+beta and h'. The times of the flux are the times of the densities moved
+back by the time delay of the peak solved flux """
+
+import csv
+import time
+import argparse
+import numpy as np
+from Flared import Flared, parse_times, delta_t, delay_times
+import cli_options
+
+PARSER = argparse.ArgumentParser(description="",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+PARSER.add_argument("time_series", nargs="?", default="data/time_series_control.csv",
+        help="Csv with a time column and a column of electron densities [m^-3]")
+PARSER.add_argument("--column", default="Ne_74",
+        help="Header of the electron density column")
+PARSER.add_argument("-he", "--height", type=float, default=74,
+        choices=[cli_options.HEIGHT_RANGE], help="Altitude [km] of the electron densities")
+cli_options.add_lookup(PARSER)
+cli_options.add_format(PARSER)
+
+def read_densities(path, column):
+
+    """ time stamps and electron densities of column from a csv """
+
+    with open(path) as a_file:
+        reader = csv.reader(a_file)
+        header = [name.strip() for name in next(reader)]
+        if column not in header:
+            raise ValueError("no column %s in %s" % (column, path))
+        index = header.index(column)
+        rows = [row for row in reader if row]
+
+    return [row[0] for row in rows], np.array([row[index] for row in rows], dtype=float)
+
+def main(args):
+
+    try:
+        stamps, ed = read_densities(args.time_series, args.column)
+    except ValueError as e:
+        PARSER.error(e)
+
+    f = Flared(lookup=args.lookup, name="Flared_inverse")
+    times = parse_times(stamps)
+    f.dated = len(stamps) > 0 and '-' in stamps[0]
+
+    start = time.perf_counter()
+    ix, beta, hprim = f.invert_ed(ed, args.height)
+    seconds = time.perf_counter() - start
+
+    solved = ~np.isnan(ix)
+    delays = np.full(len(ix), delta_t(np.max(ix, initial=0.0, where=solved)))
+    flux_times = delay_times(times, -delays)
+    columns = {'Time(Ix)': flux_times, 'Solar Flux Ix (W*m^-2)': ix, 'Time(ED)': times,
+            'Electron Density(m^-3)': ed, 'Beta(km^-1)': beta, "H'(km)": hprim}
+    f.write_table(columns, args.format)
+
+    print("%d densities inverted in %.3f ms, %d outside of the model range, "
+            "results in %s" % (len(ed), 1000*seconds, (~solved).sum(), f.folder))
+
+if __name__ == "__main__":
+    main(PARSER.parse_args())
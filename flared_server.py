@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+
+""" Long-running local ED query service. The fitted model is built once,
+concurrent queries are coalesced into vectorized batches.
+
+Protocol: one json object per line, one json response per line.
+    {"id": 1, "ix": 1e-5}             altitude profile at 50-90 km
+    {"id": 2, "ix": 1e-5, "h": 74}    single point
+ix (and h) can also be lists, h is broadcast against ix. Responses echo
+id and may arrive out of order on a connection with pipelined queries. """
+
+import os
+import stat
+import json
+import asyncio
+import argparse
+import numpy as np
+from Flared import Flared
+
+PARSER = argparse.ArgumentParser(description="",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+PARSER.add_argument("--socket", default="flared.sock",
+        help="Unix socket path to listen on")
+PARSER.add_argument("--port", type=int, default=None,
+        help="Listen on localhost TCP port instead of the unix socket")
+PARSER.add_argument("--max-batch", type=int, default=4096,
+        help="Queries evaluated in a single batch at most")
+PARSER.add_argument("--max-delay", type=float, default=0.0002,
+        help="Seconds a query waits for others to join its batch")
+PARSER.add_argument("--lookup", type=int, nargs="?", const=4096, default=None,
+        metavar="SIZE", help="Evaluate beta and h' of single Ix values from a "
+        "log-spaced lookup table")
+
+class EDService:
+
+    """ collects queries of concurrent clients and evaluates them
+    together, points in one calculate_points call and profiles in
+    one calculate_ed call """
+
+    def __init__(self, flared, max_batch=4096, max_delay=0.0002):
+
+        self.flared = flared
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.heights = flared._load_easyfit()[0]
+        self.ix_range = (flared.f_beta.x[0], flared.f_beta.x[-1])
+        self.h_range = (self.heights[0], self.heights[-1])
+
+        self._pending = []
+        self._handle = None
+
+    async def query(self, ix, h=None):
+
+        """ validates a query and waits for the batch it joins """
+
+        ix = np.asarray(ix, dtype=float)
+        if not np.all((ix >= self.ix_range[0]) & (ix <= self.ix_range[1])):
+            raise ValueError("ix must be in range %g, %g" % self.ix_range)
+        if h is not None:
+            h = np.asarray(h, dtype=float)
+            if not np.all((h >= self.h_range[0]) & (h <= self.h_range[1])):
+                raise ValueError("h must be in range %g, %g" % self.h_range)
+            ix, h = np.broadcast_arrays(ix, h)
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((ix, h, future))
+
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._handle is None:
+            self._handle = asyncio.get_running_loop().call_later(self.max_delay,
+                    self._flush)
+
+        return await future
+
+    def _flush(self):
+
+        """ evaluates all pending queries at once """
+
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        batch, self._pending = self._pending, []
+
+        points = [q for q in batch if q[1] is not None]
+        profiles = [q for q in batch if q[1] is None]
+
+        try:
+            if points:
+                self._resolve_points(points)
+            if profiles:
+                self._resolve_profiles(profiles)
+        except Exception as e:
+            for ix, h, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+
+    def _resolve_points(self, points):
+
+        ed, ed_easy, beta, hprim = self.flared.calculate_points(
+                np.concatenate([ix.ravel() for ix, h, future in points]),
+                np.concatenate([h.ravel() for ix, h, future in points]))
+
+        start = 0
+        for ix, h, future in points:
+            part = slice(start, start + ix.size)
+            start += ix.size
+            future.set_result({'ed': ed[part].reshape(ix.shape).tolist(),
+                'ed_easyfit': ed_easy[part].reshape(ix.shape).tolist(),
+                'beta': beta[part].reshape(ix.shape).tolist(),
+                'hprim': hprim[part].reshape(ix.shape).tolist()})
+
+    def _resolve_profiles(self, profiles):
+
+        ixs = np.concatenate([ix.ravel() for ix, h, future in profiles])
+        ed, beta, hprim = self.flared.calculate_ed(ixs, self.heights)
+        ed_easy = self.flared.calculate_easyfit(ixs, self.heights)
+
+        start = 0
+        for ix, h, future in profiles:
+            part = slice(start, start + ix.size)
+            start += ix.size
+            shape = ix.shape + (len(self.heights),)
+            future.set_result({'h': self.heights.tolist(),
+                'ed': ed[part].reshape(shape).tolist(),
+                'ed_easyfit': ed_easy[part].reshape(shape).tolist(),
+                'beta': beta[part].reshape(ix.shape).tolist(),
+                'hprim': hprim[part].reshape(ix.shape).tolist()})
+
+    async def handle(self, reader, writer):
+
+        """ serves a client connection, every line is answered by
+        its own task so pipelined queries share batches """
+
+        tasks = set()
+        lock = asyncio.Lock()
+
+        async def answer(line):
+            request = {}
+            try:
+                request = json.loads(line)
+                response = await self.query(request['ix'], request.get('h'))
+            except (ValueError, KeyError, TypeError) as e:
+                response = {'error': str(e)}
+            if isinstance(request, dict) and 'id' in request:
+                response['id'] = request['id']
+            async with lock:
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if line.strip():
+                    task = asyncio.create_task(answer(line))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks)
+        finally:
+            writer.close()
+
+async def serve(args):
+
+    flared = Flared(lookup=args.lookup)
+    service = EDService(flared, args.max_batch, args.max_delay)
+
+    if args.port is not None:
+        server = await asyncio.start_server(service.handle, "127.0.0.1", args.port)
+    else:
+        # a socket left behind by a previous server is replaced
+        if os.path.exists(args.socket) and stat.S_ISSOCK(os.stat(args.socket).st_mode):
+            os.remove(args.socket)
+        server = await asyncio.start_unix_server(service.handle, args.socket)
+
+    async with server:
+        await server.serve_forever()
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(serve(PARSER.parse_args()))
+    except KeyboardInterrupt:
+        pass
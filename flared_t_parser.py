@@ -3,15 +3,65 @@
 import sys
 import argparse
 from Flared import *
-from Range import Range
+import cli_options
 
 PARSER = argparse.ArgumentParser(description="",
         formatter_class=argparse.ArgumentDefaultsHelpFormatter)
 
-PARSER.add_argument("-he", "--height", type=int, default=None, required=True,
-        choices=[Range(50, 90)], help="Altitudes [km]")
+cli_options.add_heights(PARSER)
+PARSER.add_argument("--workers", type=int, default=None,
+        help="Processes used for the bootstrap refits")
+cli_options.add_fit(PARSER)
+cli_options.add_lookup(PARSER)
+PARSER.add_argument("--show", action="store_true",
+        help="Show the figure in an interactive window")
+cli_options.add_format(PARSER)
+PARSER.add_argument("--no-plot", action="store_true",
+        help="Write the data table only, skip the figure")
+PARSER.add_argument("--plot-points", type=int, default=Flared_t.plot_points,
+        help="Samples shown in the figure at most, 0 for all")
+PARSER.add_argument("--decimation", default=Flared_t.plot_decimation,
+        choices=sorted(DECIMATION), help="How samples shown in the figure are picked")
+PARSER.add_argument("--stream", action="store_true",
+        help="Process the time series in chunks with bounded memory, no figure")
+PARSER.add_argument("--chunk-size", type=int, default=Flared_t.chunk_size,
+        help="Rows per chunk in stream mode")
+PARSER.add_argument("--events", action="store_true",
+        help="Split the series into flare events, each with its own time delay")
+cli_options.add_resample(PARSER)
+cli_options.add_content(PARSER)
+cli_options.add_out_of_range(PARSER)
+cli_options.add_subset(PARSER)
+cli_options.add_bootstrap(PARSER)
+cli_options.add_profile(PARSER)
 ARGS = PARSER.parse_args()
+cli_options.check_bootstrap(PARSER, ARGS)
+Flared.confidence = ARGS.confidence
+Flared.out_of_range = ARGS.out_of_range
+Flared.fit_backend = ARGS.fit
+Flared.content_heights = cli_options.check_content(PARSER, ARGS)
+SUBSET = cli_options.subset(ARGS)
+HEIGHTS = cli_options.expand_heights(PARSER, ARGS)
 
 if __name__ == "__main__":
-    f = Flared_t(ARGS.height)
-    f.write_and_plot()
+    try:
+        f = Flared_t(HEIGHTS, stream=ARGS.stream, segment=ARGS.events,
+                workers=ARGS.workers, lookup=ARGS.lookup, subset=SUBSET,
+                bootstrap=ARGS.bootstrap)
+    except ValueError as e:
+        PARSER.error(e)
+
+    f.plot_points = ARGS.plot_points
+    f.plot_decimation = ARGS.decimation
+    f.resample = ARGS.resample
+
+    if ARGS.stream:
+        f.write_stream(ARGS.chunk_size, ARGS.format)
+    else:
+        f.write_and_plot(plot=not ARGS.no_plot, show=ARGS.show,
+                output_format=ARGS.format)
+
+    if f.out_of_range_note():
+        print(f.out_of_range_note(), file=sys.stderr)
+
+    cli_options.write_profile(ARGS, f.profile)
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+
+""" Binary sidecar of a parsed flux file. The sidecar holds (time, ix)
+records, time as int64 microseconds since the epoch and ix as float64,
+after a header with the size and mtime of the source file it was parsed
+from. A sidecar which doesn't match its source is ignored and rewritten """
+
+import os
+import struct
+import tempfile
+import numpy as np
+
+MAGIC = b'FLAREDTS'
+
+# bumped whenever parsing of the source changes, older sidecars are reparsed
+VERSION = 2
+
+# magic, version, source size, source mtime [ns], rows
+HEADER = struct.Struct('<8sqqqq')
+
+RECORD = np.dtype([('time', '<i8'), ('ix', '<f8')])
+
+SUFFIX = '.flux'
+
+def sidecar_path(source):
+
+    """ sidecar file of a source file, next to it """
+
+    return source + SUFFIX
+
+def load(source):
+
+    """ memory-maps the records of source's sidecar,
+    None if it is missing, incomplete or stale """
+
+    path = sidecar_path(source)
+    try:
+        stat = os.stat(source)
+        with open(path, 'rb') as f:
+            magic, version, size, mtime, rows = HEADER.unpack(f.read(HEADER.size))
+        if (magic, version, size, mtime) != (MAGIC, VERSION, stat.st_size,
+                stat.st_mtime_ns):
+            return None
+        if rows == 0:
+            return np.empty(0, RECORD)
+        return np.memmap(path, dtype=RECORD, mode='r', offset=HEADER.size,
+                shape=(rows,))
+    except (OSError, ValueError, struct.error):
+        return None
+
+class SidecarWriter:
+
+    """ writes the records of a source file chunk by chunk to a temporary
+    file, which is moved in place by close(), so concurrent jobs never map
+    a partially written sidecar. The source is stat'ed before parsing, a
+    source modified meanwhile leaves a stale sidecar behind """
+
+    def __init__(self, source):
+
+        stat = os.stat(source)
+        self.source = source
+        self.header = MAGIC, VERSION, stat.st_size, stat.st_mtime_ns
+        self.rows = 0
+
+        fd, self.tmp = tempfile.mkstemp(dir=os.path.dirname(source) or '.',
+                suffix=SUFFIX)
+        self.file = os.fdopen(fd, 'wb')
+        self.file.write(HEADER.pack(*self.header, 0))
+
+    def write(self, times, ix):
+
+        """ appends times (datetime64) and ix's of a chunk """
+
+        records = np.empty(len(ix), RECORD)
+        records['time'] = np.asarray(times, dtype='datetime64[us]').view('i8')
+        records['ix'] = ix
+        records.tofile(self.file)
+        self.rows += len(ix)
+
+    def close(self):
+
+        """ completes the header and moves the sidecar in place """
+
+        self.file.seek(0)
+        self.file.write(HEADER.pack(*self.header, self.rows))
+        self.file.close()
+        os.replace(self.tmp, sidecar_path(self.source))
+
+    def abort(self):
+
+        """ drops an incomplete sidecar """
+
+        self.file.close()
+        os.remove(self.tmp)
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+
+""" Linear interpolation of the fitted beta and hprim knots, and a dense
+log-spaced lookup table of them """
+
+import math
+import numpy as np
+
+class LinearInterpolant:
+
+    """ piecewise linear function through the knots (x, y), a numpy
+    stand-in for scipy's interp1d: keeps .x and .y, returns arrays (0-d for
+    scalars), passes nan through and raises ValueError outside of x """
+
+    def __init__(self, x, y):
+
+        order = np.argsort(x, kind='mergesort')
+        self.x = np.asarray(x, dtype=float)[order]
+        self.y = np.asarray(y, dtype=float)[order]
+
+    def __call__(self, ix):
+
+        """ evaluates the function at ix (scalar or array) """
+
+        ix = np.asarray(ix, dtype=float)
+        if np.any(ix < self.x[0]):
+            raise ValueError("A value in x_new is below the interpolation range.")
+        if np.any(ix > self.x[-1]):
+            raise ValueError("A value in x_new is above the interpolation range.")
+
+        return np.asarray(np.interp(ix, self.x, self.y))
+
+class LookupTable:
+
+    """ samples a function of ix on a grid uniform in log10(ix), evaluates it
+    by direct index arithmetic and linear blending between the two nearest
+    nodes, without a binary search. The table serves scalars, arrays are
+    passed on to f itself: np.interp over the knots is both faster than the
+    table on arrays and exact. Raises ValueError outside the sampled range.
+
+    max_error is the largest absolute difference from the sampled function,
+    checked at the function's own knots and midpoints (x) on construction """
+
+    def __init__(self, f, x, size=4096):
+
+        self.f = f
+        self.x = np.asarray(x, dtype=float)
+        self.size = size
+
+        self.u0 = np.log10(self.x[0])
+        u1 = np.log10(self.x[-1])
+        self.inv_du = (size - 1)/(u1 - self.u0)
+
+        grid = np.logspace(self.u0, u1, size)
+        grid[0], grid[-1] = self.x[0], self.x[-1]
+        self.values = f(grid)
+
+        # slopes between nodes, so evaluation is a single multiply-add
+        self.slopes = np.append(np.diff(self.values), 0.0)
+
+        check = np.sort(np.concatenate((self.x, (self.x[1:] + self.x[:-1])/2)))
+        self.max_error = max(abs(self._evaluate_scalar(ix) - value)
+                for ix, value in zip(check.tolist(), f(check).tolist()))
+
+    def __call__(self, ix):
+
+        """ evaluates table at a scalar ix, arrays are evaluated by f """
+
+        if np.ndim(ix) == 0:
+            return self._evaluate_scalar(float(ix))
+
+        return self.f(ix)
+
+    def _evaluate_scalar(self, ix):
+
+        """ scalar path without numpy array overhead """
+
+        if not self.x[0] <= ix <= self.x[-1]:
+            if math.isnan(ix):
+                return math.nan
+            raise ValueError("A value in ix is outside the lookup table range.")
+
+        t = (math.log10(ix) - self.u0)*self.inv_du
+        i = min(int(t), self.size - 1)
+
+        return float(self.values[i] + self.slopes[i]*(t - i))
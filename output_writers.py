@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+
+""" Column-wise writers of calculated tables. A writer is fed chunks, dicts
+of equally long columns: csv and gzip compressed csv through csv.writer, and
+numpy binary npz (one array per column) or npy (one record array, which can
+be memory-mapped with np.load(mmap_mode='r')) written without building
+per-row objects """
+
+import os
+import csv
+import gzip
+import shutil
+import tempfile
+import numpy as np
+
+class TableWriter:
+
+    """ base of the writers, used as a context manager around the
+    write calls, the output is complete once the writer is closed """
+
+    extension = None
+
+    # text formats get timestamps as formatted strings, binary ones as datetime64
+    text = True
+
+    def __init__(self, path):
+
+        self.path = path
+        self.rows = 0
+        self.bytes_written = 0
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+
+        self.close()
+
+    def write(self, columns):
+
+        """ appends a chunk of columns """
+
+        raise NotImplementedError
+
+    def flush(self):
+
+        """ makes the rows written so far visible to readers of the
+        output, where the format allows it """
+
+    def close(self):
+
+        """ finishes the output file """
+
+        raise NotImplementedError
+
+class CsvWriter(TableWriter):
+
+    """ csv with the header of the first chunk, written by csv.writer from
+    column lists converted a block at a time, so numbers are python floats
+    written with their shortest repr rather than numpy scalars """
+
+    extension = 'csv'
+
+    # rows converted to lists at once, bounds the memory of a block
+    block_rows = 65536
+
+    def __init__(self, path):
+
+        super().__init__(path)
+        self.file = None
+        self.writer = None
+
+    def _open(self):
+
+        return open(self.path, mode='w', newline='')
+
+    def write(self, columns):
+
+        values = [np.asarray(v) for v in columns.values()]
+        if self.file is None:
+            self.file = self._open()
+            self.writer = csv.writer(self.file)
+            self.writer.writerow(columns.keys())
+
+        rows = len(values[0]) if values else 0
+        for start in range(0, rows, self.block_rows):
+            self.writer.writerows(zip(*[v[start:start + self.block_rows].tolist()
+                for v in values]))
+        self.rows += rows
+
+    def flush(self):
+
+        if self.file is not None:
+            self.file.flush()
+
+    def close(self):
+
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+            self.writer = None
+            self.bytes_written = os.path.getsize(self.path)
+
+class GzipCsvWriter(CsvWriter):
+
+    """ csv compressed on the fly with gzip """
+
+    extension = 'csv.gz'
+
+    # favours speed, on flarED tables level 6 is about 6 times
+    # slower than level 1 for a 6% smaller file
+    compresslevel = 1
+
+    def _open(self):
+
+        return gzip.open(self.path, mode='wt', newline='',
+                compresslevel=self.compresslevel)
+
+class NpzWriter(TableWriter):
+
+    """ numpy npz archive with one array per column, named by the column
+    headers. Chunks are kept in memory up to spill_rows, longer outputs are
+    spilled column by column to raw files next to the output """
+
+    extension = 'npz'
+    text = False
+
+    spill_rows = 1000000
+
+    def __init__(self, path):
+
+        super().__init__(path)
+        self.names = None
+        self.dtypes = None
+        self.buffered = []
+        self.spill = None
+
+    def write(self, columns):
+
+        values = [np.asarray(v) for v in columns.values()]
+        if self.names is None:
+            self.names = list(columns)
+            self.dtypes = [v.dtype for v in values]
+        self.buffered.append(values)
+        self.rows += len(values[0]) if values else 0
+
+        if sum(len(chunk[0]) for chunk in self.buffered if chunk) > self.spill_rows:
+            self._spill()
+
+    def _spill(self):
+
+        """ appends buffered chunks to the per column raw files """
+
+        if self.spill is None:
+            self.spill = tempfile.mkdtemp(prefix='.spill-',
+                    dir=os.path.dirname(self.path) or '.')
+        for i, dtype in enumerate(self.dtypes):
+            with open(os.path.join(self.spill, str(i)), 'ab') as f:
+                for chunk in self.buffered:
+                    np.ascontiguousarray(chunk[i], dtype=dtype).tofile(f)
+        self.buffered = []
+
+    def _columns(self):
+
+        """ complete columns, memory-mapped from the raw files when spilled """
+
+        if self.spill is None:
+            return [np.concatenate([chunk[i] for chunk in self.buffered]).astype(dtype,
+                copy=False) for i, dtype in enumerate(self.dtypes)]
+
+        self._spill()
+        return [np.memmap(os.path.join(self.spill, str(i)), dtype=dtype, mode='r',
+            shape=(self.rows,)) if self.rows else np.empty(0, dtype)
+            for i, dtype in enumerate(self.dtypes)]
+
+    def close(self):
+
+        if self.names is None:
+            return
+        try:
+            self._save(self._columns())
+        finally:
+            if self.spill is not None:
+                shutil.rmtree(self.spill)
+            self.names = None
+            self.buffered = []
+        self.bytes_written = os.path.getsize(self.path)
+
+    def _save(self, columns):
+
+        np.savez(self.path, **dict(zip(self.names, columns)))
+
+class NpyWriter(NpzWriter):
+
+    """ numpy npy file holding a single record array with a field per
+    column, filled column by column through a memory map """
+
+    extension = 'npy'
+
+    def _save(self, columns):
+
+        table = np.lib.format.open_memmap(self.path, mode='w+',
+                dtype=list(zip(self.names, self.dtypes)), shape=(self.rows,))
+        for name, column in zip(self.names, columns):
+            table[name] = column
+        table.flush()
+        del table
+
+WRITERS = {writer.extension: writer for writer in
+        (CsvWriter, GzipCsvWriter, NpzWriter, NpyWriter)}
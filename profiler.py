@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+
+""" Lightweight stage timers and counters for flarED runs """
+
+import sys
+import time
+import functools
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+class Profiler:
+
+    """ accumulates wall time and number of calls per stage along with
+    named counters. Nested stages are timed inclusively. Cheap enough to
+    stay on, a stage costs two perf_counter calls """
+
+    def __init__(self):
+
+        self.start = time.perf_counter()
+        self.timers = {}
+        self.counters = {}
+
+    @contextmanager
+    def stage(self, name):
+
+        """ times the body of a with block under the given stage name """
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            timer = self.timers.setdefault(name, [0.0, 0])
+            timer[0] += time.perf_counter() - start
+            timer[1] += 1
+
+    def count(self, name, n=1):
+
+        """ adds n to a named counter """
+
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    @staticmethod
+    def peak_memory():
+
+        """ peak resident memory of the process in bytes, None if unknown """
+
+        if resource is None:
+            return None
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+        # linux reports kilobytes, macos bytes
+        return peak if sys.platform == 'darwin' else peak*1024
+
+    def report(self):
+
+        """ structured report of all stages and counters """
+
+        return {'total_seconds': time.perf_counter() - self.start,
+                'stages': {name: {'seconds': seconds, 'calls': calls}
+                    for name, (seconds, calls) in self.timers.items()},
+                'counters': dict(self.counters),
+                'peak_memory_bytes': self.peak_memory()}
+
+def profiled(name):
+
+    """ decorator timing a method as a stage of the instance's profiler,
+    which is expected in its profile attribute """
+
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self.profile.stage(name):
+                return method(self, *args, **kwargs)
+        return wrapper
+
+    return decorator
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+
+""" Resampling of calculated time series tables from the delayed ED time
+axis back onto the flux time stamps or onto a uniform time grid, so that
+ED's and Ix in a row share their time. Chunks are resampled as they come,
+only the samples needed across chunk boundaries are carried over.
+Interpolation is linear, resampled values never overshoot their neighbours
+and stay monotonic around flare peaks """
+
+import numpy as np
+
+# columns on the flux time axis, all the others are on the delayed one
+FLUX_COLUMNS = ('Height(km)', 'Time(Ix)', 'Solar Flux Ix (W*m^-2)', 'Time(ED)')
+
+def resample_step(value):
+
+    """ resample setting from the command line: 'ix' for the flux time
+    stamps, otherwise a positive grid step in seconds """
+
+    if value == 'ix':
+        return value
+    step = float(value)
+    if not step > 0:
+        raise ValueError("step must be positive")
+
+    return step
+
+class Resampler:
+
+    """ resamples chunks of columns (as made by Flared_t) onto the flux
+    time stamps (step None) or onto a grid of step seconds, aligned to
+    multiples of step since the epoch (since midnight for steps dividing a
+    day) and spanning the flux series. Rows
+    are returned once the delayed axis has passed their time, the rest by
+    flush(). Times the delayed axis doesn't cover get nan """
+
+    def __init__(self, step=None):
+
+        self.step = None if step is None else \
+                np.timedelta64(int(round(step*1.0e6)), 'us')
+        self.names = None
+        self.height = None
+
+        # output times waiting for the delayed axis, with their ix's
+        self._pending = []
+
+        # last flux sample (for the grid) and the delayed samples (times
+        # and values) later output times fall between, carried into the
+        # next chunk
+        self._flux = None
+        self._delayed = None
+        self._next = None
+
+    def feed(self, chunk):
+
+        """ takes a calculated chunk, returns the resampled rows ready so far """
+
+        if self.names is None:
+            self.names = [key for key in chunk if key not in FLUX_COLUMNS]
+            if 'Height(km)' in chunk and len(chunk['Height(km)']):
+                self.height = chunk['Height(km)'][0]
+
+        times = np.asarray(chunk['Time(Ix)'], dtype='datetime64[us]').view('i8')
+        if not len(times):
+            return self._emit(None, until=np.iinfo(np.int64).min)
+
+        self._add_targets(times, np.asarray(chunk['Solar Flux Ix (W*m^-2)'],
+            dtype=float))
+        delayed = self._extend_delayed(
+                np.asarray(chunk['Time(ED)'], dtype='datetime64[us]').view('i8'),
+                [np.asarray(chunk[key], dtype=float) for key in self.names])
+        rows = self._emit(delayed, until=delayed[0][-1])
+
+        # later output times are past the first pending one, or past the
+        # last flux time, the delayed samples before them are dropped
+        bound = self._pending[0][0][0] if self._pending else times[-1]
+        start = max(np.searchsorted(delayed[0], bound, 'right') - 1, 0)
+        self._delayed = delayed[0][start:], [v[start:] for v in delayed[1]]
+
+        return rows
+
+    def flush(self):
+
+        """ returns the remaining rows, at the end of the series """
+
+        return self._emit(self._delayed, until=None)
+
+    def _add_targets(self, times, ix):
+
+        """ queues the output times of a chunk, the flux time stamps
+        themselves or the grid times up to the last one """
+
+        if self.step is None:
+            self._pending.append((times, ix))
+            return
+
+        step = self.step.astype('i8')
+        if self._next is None:
+            self._next = -(-times[0]//step)*step
+        grid = np.arange(self._next, times[-1] + 1, step)
+        if len(grid):
+            known_times, known_ix = times, ix
+            if self._flux is not None:
+                known_times = np.append(self._flux[0], times)
+                known_ix = np.append(self._flux[1], ix)
+            self._pending.append((grid, np.interp(grid.astype(float),
+                known_times.astype(float), known_ix)))
+            self._next = grid[-1] + step
+        self._flux = times[-1], ix[-1]
+
+    def _extend_delayed(self, times, values):
+
+        """ the carried delayed samples followed by those of a chunk, the
+        axis is kept non-decreasing where delays of events overlap """
+
+        if self._delayed is not None:
+            times = np.append(self._delayed[0], times)
+            values = [np.append(carried, v) for carried, v in
+                    zip(self._delayed[1], values)]
+
+        return np.maximum.accumulate(times), values
+
+    def _emit(self, delayed, until):
+
+        """ interpolates the pending output times up to until (all of
+        them if None) from the delayed samples """
+
+        if self.names is None:
+            return {}
+        targets = np.concatenate([t for t, ix in self._pending]) \
+                if self._pending else np.empty(0, dtype='i8')
+        ix = np.concatenate([ix for t, ix in self._pending]) \
+                if self._pending else np.empty(0)
+        n = len(targets) if until is None else np.searchsorted(targets, until, 'right')
+        self._pending = [(targets[n:], ix[n:])] if n < len(targets) else []
+        targets, ix = targets[:n], ix[:n]
+
+        columns = {}
+        if self.height is not None:
+            columns['Height(km)'] = np.full(n, self.height)
+        columns['Time'] = targets.view('datetime64[us]')
+        columns['Solar Flux Ix (W*m^-2)'] = ix
+        for i, key in enumerate(self.names):
+            if delayed is None:
+                columns[key] = np.full(n, np.nan)
+            else:
+                columns[key] = np.interp(targets.astype(float),
+                        delayed[0].astype(float), delayed[1][i],
+                        left=np.nan, right=np.nan)
+
+        return columns
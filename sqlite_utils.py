@@ -1,8 +1,15 @@
 #!/usr/bin/env python3
 
+import re
 import sqlite3
 from sqlite3 import Error
 
+MONTHS = ['jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep',
+        'oct', 'nov', 'dec']
+
+# decimal exponents of the peak flux [W/m2] of the flare class letters
+CLASSES = {'A': -8, 'B': -7, 'C': -6, 'M': -5, 'X': -4}
+
 def create_connection(db_file):
     """ create a database connection to the SQLite database
         specified by db_file
@@ -51,17 +58,66 @@ def truncate_table(conn, table_name):
     cur.execute("DELETE FROM %s;" %(table_name))
     conn.commit()
 
-def custom_query(conn, sql):
+def custom_query(conn, sql, params=()):
     """ execute a custom query
     :param conn: Connection object
     :param sql: a custom SELECT statement
+    :param params: values of the statement placeholders
     :return: query
     """
     cur = conn.cursor()
-    cur.execute(sql)
+    cur.execute(sql, params)
     query = cur.fetchall()
 
     if query == None:
         raise ValueError("Something went wrong")
 
     return query
+
+def set_journal_mode(conn, mode):
+    """ set journal mode of the database, WAL mode checkpoints
+    and removes the write-ahead log when switched back
+    :param conn: Connection object
+    :param mode: journal mode, e.g. WAL or DELETE
+    :return: journal mode in effect
+    """
+    cur = conn.cursor()
+    cur.execute("PRAGMA journal_mode=%s;" %(mode))
+    return cur.fetchone()[0]
+
+def iso_date(date):
+    """ converts a date as written in the flares table (01 Jan 1971,
+    1 July 2012, 10 Mar2014) to YYYY-MM-DD
+    :param date: date text
+    :return: iso date text or None if not recognized
+    """
+    match = re.match(r"\s*(\d{1,2})\s*([A-Za-z]{3})[A-Za-z]*\s*(\d{4})", date or "")
+    if match is None or match.group(2).lower() not in MONTHS:
+        return None
+    day, month, year = match.groups()
+    return "%s-%02d-%02d" % (year, MONTHS.index(month.lower()) + 1, int(day))
+
+def create_date_function(conn):
+    """ register iso_date as an sql function of the connection
+    :param conn: Connection object
+    """
+    conn.create_function("iso_date", 1, iso_date, deterministic=True)
+
+def class_flux(flare_class):
+    """ converts a flare class as written in the flares table (C5.8, M2,
+    X) to its peak flux, a letter alone stands for magnitude 1
+    :param flare_class: flare class text
+    :return: flux [W/m2] or None if not recognized
+    """
+    match = re.match(r"\s*([ABCMX])\s*(\d+(?:\.\d*)?)?\s*$", flare_class or "",
+            re.IGNORECASE)
+    if match is None:
+        return None
+    letter, magnitude = match.groups()
+    return float("%se%d" % (magnitude or "1", CLASSES[letter.upper()]))
+
+def create_class_function(conn):
+    """ register class_flux as an sql function of the connection
+    :param conn: Connection object
+    """
+    conn.create_function("class_flux", 1, class_flux, deterministic=True)